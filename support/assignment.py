@@ -0,0 +1,189 @@
+# Copyright (c) 2023, developers@frappe.io and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.desk.form.assign_to import add as add_assign
+from frappe.desk.form.assign_to import close_all_assignments
+from frappe.query_builder.functions import Coalesce
+from support.utils import admin_session
+
+ROUND_ROBIN = "Round Robin"
+LEAST_OPEN_TICKETS = "Least Open Tickets"
+WEIGHTED = "Weighted"
+
+
+def get_assignment_mode(support_provider):
+    return (
+        frappe.get_cached_value("Support Provider", support_provider, "assignment_mode")
+        or ROUND_ROBIN
+    )
+
+
+def uses_assignment_rule(support_provider):
+    """Round robin is left to the team's Assignment Rule, other modes are assigned here."""
+    return get_assignment_mode(support_provider) == ROUND_ROBIN
+
+
+def on_issue_update(doc, method):
+    previous = doc.get_doc_before_save()
+    if doc.has_value_changed("support_provider") and previous:
+        frappe.db.set_value(
+            "Support Ticket Assignment",
+            {"issue": doc.name},
+            "support_provider",
+            doc.support_provider,
+            update_modified=False,
+        )
+
+    if doc.status == "Closed":
+        if previous and previous.status != "Closed":
+            # closing the assignments releases them from the open ticket counters
+            close_all_assignments("Issue", doc.name)
+        return
+
+    if doc.status != "Open" or not doc.support_provider:
+        return
+    if uses_assignment_rule(doc.support_provider):
+        return
+    # _assign is written straight to the database, the document can be stale
+    if frappe.parse_json(frappe.db.get_value("Issue", doc.name, "_assign") or "[]"):
+        return
+    assign_issue(doc)
+
+
+def assign_issue(issue):
+    user = get_assignee(issue.support_provider)
+    if not user:
+        return
+
+    with admin_session():
+        add_assign(
+            {
+                "assign_to": [user],
+                "doctype": "Issue",
+                "name": issue.name,
+                "description": issue.subject,
+            }
+        )
+    return user
+
+
+def get_assignee(support_provider, exclude=()):
+    """Pick the active agent of the provider with the lowest load.
+
+    Loads are the agents' open ticket counters of the provider's dashboard,
+    so this is one query over the provider's team members and no counting.
+    """
+    mode = get_assignment_mode(support_provider)
+    SupportProviderTeam = frappe.qb.DocType("Support Provider Team")
+    SupportTeamMember = frappe.qb.DocType("Support Team Member")
+    Counter = frappe.qb.DocType("Support Dashboard Counter")
+    members = (
+        frappe.qb.from_(SupportTeamMember)
+        .inner_join(SupportProviderTeam)
+        .on(SupportProviderTeam.name == SupportTeamMember.parent)
+        .left_join(Counter)
+        .on(
+            (Counter.support_provider == support_provider)
+            & (Counter.scope == "Agent")
+            & (Counter.scope_name == SupportTeamMember.user)
+            & (Counter.metric == "open")
+        )
+        .select(
+            SupportTeamMember.user,
+            SupportTeamMember.weight,
+            Coalesce(Counter.value, 0).as_("open_tickets"),
+        )
+        .where(
+            (SupportProviderTeam.support_provider == support_provider)
+            & (SupportTeamMember.disabled == 0)
+        )
+        .run(as_dict=True)
+    )
+
+    members = [member for member in members if member.user not in exclude]
+    if mode == WEIGHTED:
+        members = [member for member in members if member.weight > 0]
+
+    def get_load(member):
+        if mode == WEIGHTED:
+            return member.open_tickets / member.weight
+        return member.open_tickets
+
+    if not members:
+        return None
+    return min(members, key=lambda member: (get_load(member), member.user)).user
+
+
+def update_assignment_index(doc, method):
+    """Mirror open Issue ToDos into Support Ticket Assignment, one row per assignee."""
+    if doc.reference_type != "Issue" or not doc.reference_name:
+        return
+
+    previous = doc.get_doc_before_save() if method == "on_update" else None
+    if previous and previous.allocated_to != doc.allocated_to:
+        remove_from_assignment_index(doc.reference_name, previous.allocated_to)
+
+    if doc.status == "Open" and method != "on_trash":
+        add_to_assignment_index(doc.reference_name, doc.allocated_to)
+    else:
+        remove_from_assignment_index(doc.reference_name, doc.allocated_to)
+
+
+def add_to_assignment_index(issue, user):
+    if not user or is_assigned(issue, user):
+        return
+    try:
+        frappe.get_doc(
+            {
+                "doctype": "Support Ticket Assignment",
+                "issue": issue,
+                "user": user,
+                "support_provider": frappe.db.get_value(
+                    "Issue", issue, "support_provider"
+                ),
+            }
+        ).db_insert()
+    except (frappe.DuplicateEntryError, frappe.UniqueValidationError):
+        # a concurrent update indexed the same assignment after the check
+        pass
+
+
+def remove_from_assignment_index(issue, user):
+    frappe.db.delete("Support Ticket Assignment", {"issue": issue, "user": user})
+
+
+def delete_assignment_index(doc, method):
+    frappe.db.delete("Support Ticket Assignment", {"issue": doc.name})
+
+
+def is_assigned(issue, user):
+    return bool(
+        frappe.db.exists("Support Ticket Assignment", {"issue": issue, "user": user})
+    )
+
+
+def rebuild_assignment_index():
+    frappe.db.delete("Support Ticket Assignment")
+    ToDo = frappe.qb.DocType("ToDo")
+    Issue = frappe.qb.DocType("Issue")
+    assignments = (
+        frappe.qb.from_(ToDo)
+        .inner_join(Issue)
+        .on(ToDo.reference_name == Issue.name)
+        .select(ToDo.reference_name, ToDo.allocated_to, Issue.support_provider)
+        .where((ToDo.reference_type == "Issue") & (ToDo.status == "Open"))
+        .distinct()
+        .run()
+    )
+    for issue, user, support_provider in assignments:
+        if not user:
+            continue
+        frappe.get_doc(
+            {
+                "doctype": "Support Ticket Assignment",
+                "issue": issue,
+                "user": user,
+                "support_provider": support_provider,
+            }
+        ).db_insert()
@@ -0,0 +1,25 @@
+# Copyright (c) 2023, developers@frappe.io and contributors
+# For license information, please see license.txt
+
+import click
+import frappe
+from frappe.commands import get_site, pass_context
+
+
+@click.command("rebuild-support-dashboard")
+@pass_context
+def rebuild_support_dashboard(context):
+    "Recount the agent portal dashboard counters from all tickets"
+    from support.dashboard import rebuild_dashboard_counters
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        rebuild_dashboard_counters()
+        frappe.db.commit()
+    finally:
+        frappe.destroy()
+
+
+commands = [rebuild_support_dashboard]
@@ -0,0 +1,269 @@
+# Copyright (c) 2023, developers@frappe.io and contributors
+# For license information, please see license.txt
+
+import hashlib
+from collections import defaultdict
+
+import frappe
+from frappe.utils import get_datetime, now, time_diff_in_seconds
+from support.sla import SLA_DEADLINES, get_last_run
+
+COUNTER_DOCTYPE = "Support Dashboard Counter"
+CLOSED_STATUSES = ("Resolved", "Closed")
+REBUILD_BATCH_SIZE = 5000
+
+ISSUE_FIELDS = [
+    "name",
+    "status",
+    "priority",
+    "support_provider",
+    "site_name",
+    "creation",
+    "first_responded_on",
+    "resolution_date",
+    "resolution_by",
+]
+
+
+def get_contribution(issue, watermark=None):
+    """Counter values a single ticket adds to every scope it belongs to.
+
+    A ticket counts as overdue once the SLA check has passed its resolution
+    deadline, which is when `check_sla` adds it to the counters. `watermark`
+    is the stored time of that check's last run.
+    """
+    metrics = {
+        "total": 1,
+        f"status:{issue.status}": 1,
+        f"priority:{issue.priority or 'None'}": 1,
+    }
+    if issue.status not in CLOSED_STATUSES:
+        metrics["open"] = 1
+    if (
+        watermark
+        and issue.resolution_by
+        and issue.status in SLA_DEADLINES["resolution_by"]
+        and get_datetime(issue.resolution_by) <= watermark
+    ):
+        metrics["overdue"] = 1
+    if issue.first_responded_on:
+        metrics["responded"] = 1
+        metrics["response_seconds"] = time_diff_in_seconds(
+            issue.first_responded_on, issue.creation
+        )
+    if issue.resolution_date:
+        metrics["resolved"] = 1
+        metrics["resolution_seconds"] = time_diff_in_seconds(
+            issue.resolution_date, issue.creation
+        )
+    return metrics
+
+
+def get_scopes(issue, assignees):
+    if not issue.support_provider:
+        return []
+    scopes = [("Provider", issue.support_provider)]
+    if issue.site_name:
+        scopes.append(("Site", issue.site_name))
+    scopes += [("Agent", user) for user in assignees if user]
+    return scopes
+
+
+def add_contribution(deltas, issue, assignees, sign=1, watermark=None):
+    metrics = get_contribution(issue, watermark)
+    for scope, scope_name in get_scopes(issue, assignees):
+        for metric, value in metrics.items():
+            deltas[(issue.support_provider, scope, scope_name, metric)] += sign * value
+
+
+def get_assignees(issue_name):
+    return frappe.get_all(
+        "Support Ticket Assignment", filters={"issue": issue_name}, pluck="user"
+    )
+
+
+def update_issue_counters(doc, method):
+    if method == "on_trash":
+        move_counters(doc, None)
+    else:
+        move_counters(doc.get_doc_before_save(), doc)
+
+
+def move_counters(before, after):
+    """Replace the counts of a ticket as it was `before` with the counts of it `after`.
+
+    Call this directly for changes written with `frappe.db.set_value`.
+    """
+    watermark = get_last_run()
+    assignees = get_assignees((after or before).name)
+    deltas = defaultdict(float)
+    if before:
+        add_contribution(deltas, before, assignees, -1, watermark)
+    if after:
+        add_contribution(deltas, after, assignees, 1, watermark)
+    update_counters(deltas)
+
+
+def update_agent_counters(doc, method):
+    """Move the ticket's counts to and from an agent as it is assigned and unassigned."""
+    if doc.reference_type != "Issue" or not doc.reference_name:
+        return
+
+    issue = frappe.db.get_value(
+        "Issue", doc.reference_name, ISSUE_FIELDS, as_dict=True
+    )
+    if not issue:
+        return
+
+    watermark = get_last_run()
+    deltas = defaultdict(float)
+    if method == "on_trash":
+        if doc.status == "Open":
+            add_contribution(deltas, issue, [doc.allocated_to], -1, watermark)
+    else:
+        previous = doc.get_doc_before_save()
+        if previous and previous.status == "Open":
+            add_contribution(deltas, issue, [previous.allocated_to], -1, watermark)
+        if doc.status == "Open":
+            add_contribution(deltas, issue, [doc.allocated_to], 1, watermark)
+
+    # only the agent scope moves, the provider and site keep the ticket
+    update_counters({key: delta for key, delta in deltas.items() if key[1] == "Agent"})
+
+
+def count_overdue(support_provider, tickets):
+    """Add tickets whose resolution deadline the SLA check just passed."""
+    deltas = defaultdict(float)
+    for ticket in tickets:
+        scopes = [("Provider", support_provider)]
+        if ticket.site_name:
+            scopes.append(("Site", ticket.site_name))
+        scopes += [("Agent", user) for user in ticket.assignees]
+        for scope, scope_name in scopes:
+            deltas[(support_provider, scope, scope_name, "overdue")] += 1
+    update_counters(deltas)
+
+
+def update_counters(deltas):
+    values = []
+    timestamp = now()
+    for (support_provider, scope, scope_name, metric), delta in deltas.items():
+        if not delta:
+            continue
+        values += [
+            get_counter_name(support_provider, scope, scope_name, metric),
+            support_provider,
+            scope,
+            scope_name,
+            metric,
+            delta,
+            timestamp,
+            timestamp,
+        ]
+    if not values:
+        return
+
+    rows = len(values) // 8
+    frappe.db.sql(
+        f"""
+        insert into `tab{COUNTER_DOCTYPE}`
+            (name, support_provider, scope, scope_name, metric, value, creation, modified)
+        values {", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s)"] * rows)}
+        on duplicate key update value = value + values(value), modified = values(modified)
+        """,
+        values,
+    )
+
+
+def get_counter_name(*key):
+    # deterministic names let concurrent saves upsert the same row
+    return hashlib.md5("\0".join(key).encode()).hexdigest()
+
+
+def get_summary(support_provider, scope, scope_name):
+    """Counts by status and priority, open and overdue totals and average times."""
+    counters = frappe.get_all(
+        COUNTER_DOCTYPE,
+        filters={
+            "support_provider": support_provider,
+            "scope": scope,
+            "scope_name": scope_name,
+        },
+        fields=["metric", "value"],
+    )
+    values = {counter.metric: max(counter.value, 0) for counter in counters}
+
+    summary = frappe._dict(
+        total=int(values.get("total", 0)),
+        open=int(values.get("open", 0)),
+        overdue=int(values.get("overdue", 0)),
+        status={},
+        priority={},
+        avg_first_response=None,
+        avg_resolution=None,
+    )
+    for metric, value in values.items():
+        group, _, key = metric.partition(":")
+        if key and value:
+            summary[group][key] = int(value)
+    if values.get("responded"):
+        summary.avg_first_response = values["response_seconds"] / values["responded"]
+    if values.get("resolved"):
+        summary.avg_resolution = values["resolution_seconds"] / values["resolved"]
+    return summary
+
+
+def rebuild_dashboard_counters():
+    """Recount every counter from Issue and Support Ticket Assignment.
+
+    Each provider's counters are counted first and then replaced and committed
+    at once, so saves of its tickets only wait for that short write instead of
+    for the whole rebuild.
+    """
+    watermark = get_last_run()
+    providers = frappe.get_all(
+        "Issue",
+        filters={"support_provider": ("is", "set")},
+        distinct=True,
+        pluck="support_provider",
+    )
+    for support_provider in providers:
+        deltas = count_provider_tickets(support_provider, watermark)
+        frappe.db.delete(COUNTER_DOCTYPE, {"support_provider": support_provider})
+        update_counters(deltas)
+        frappe.db.commit()
+
+    # counters of providers left without tickets
+    Counter = frappe.qb.DocType(COUNTER_DOCTYPE)
+    query = frappe.qb.from_(Counter).delete()
+    if providers:
+        query = query.where(Counter.support_provider.notin(providers))
+    query.run()
+    frappe.db.commit()
+
+
+def count_provider_tickets(support_provider, watermark=None):
+    deltas = defaultdict(float)
+    last_name = ""
+    while True:
+        issues = frappe.get_all(
+            "Issue",
+            filters={"support_provider": support_provider, "name": (">", last_name)},
+            fields=ISSUE_FIELDS,
+            order_by="name asc",
+            limit=REBUILD_BATCH_SIZE,
+        )
+        if not issues:
+            return deltas
+
+        assignees = defaultdict(list)
+        for assignment in frappe.get_all(
+            "Support Ticket Assignment",
+            filters={"issue": ("in", [issue.name for issue in issues])},
+            fields=["issue", "user"],
+        ):
+            assignees[assignment.issue].append(assignment.user)
+
+        for issue in issues:
+            add_contribution(deltas, issue, assignees[issue.name], 1, watermark)
+        last_name = issues[-1].name
@@ -0,0 +1,8 @@
+// Copyright (c) 2023, developers@frappe.io and contributors
+// For license information, please see license.txt
+
+// frappe.ui.form.on("Support Dashboard Counter", {
+// 	refresh(frm) {
+
+// 	},
+// });
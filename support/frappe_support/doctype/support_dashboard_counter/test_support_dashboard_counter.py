@@ -0,0 +1,62 @@
+# Copyright (c) 2023, developers@frappe.io and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from support.dashboard import get_summary, rebuild_dashboard_counters
+
+
+class TestSupportDashboardCounter(FrappeTestCase):
+	def setUp(self):
+		if not frappe.db.exists("Support Provider", "Counter Provider"):
+			frappe.get_doc(
+				{"doctype": "Support Provider", "__newname": "Counter Provider"}
+			).insert(ignore_permissions=True)
+		if not frappe.db.exists("Supported Site", "counters.example.com"):
+			frappe.get_doc(
+				{
+					"doctype": "Supported Site",
+					"site_name": "counters.example.com",
+					"support_provider": "Counter Provider",
+				}
+			).insert(ignore_permissions=True)
+
+	def make_issue(self, **values):
+		return frappe.get_doc(
+			{
+				"doctype": "Issue",
+				"subject": "Dashboard counters",
+				"raised_by": "user@example.com",
+				"site_name": "counters.example.com",
+				"support_provider": "Counter Provider",
+				**values,
+			}
+		).insert(ignore_permissions=True)
+
+	def get_summary(self):
+		return get_summary("Counter Provider", "Provider", "Counter Provider")
+
+	def test_counters_follow_tickets(self):
+		before = self.get_summary()
+		self.make_issue()
+		closed = self.make_issue()
+		closed.status = "Closed"
+		closed.save(ignore_permissions=True)
+
+		summary = self.get_summary()
+		self.assertEqual(summary.total, before.total + 2)
+		self.assertEqual(summary.open, before.open + 1)
+		self.assertEqual(
+			summary.status.get("Closed", 0), before.status.get("Closed", 0) + 1
+		)
+
+		# a rebuild recounts the same numbers the saves kept
+		with patch.object(frappe.db, "commit"):
+			rebuild_dashboard_counters()
+		self.assertEqual(self.get_summary(), summary)
+		self.assertEqual(
+			summary.total,
+			frappe.db.count("Issue", {"support_provider": "Counter Provider"}),
+		)
@@ -1,9 +1,25 @@
 # Copyright (c) 2023, developers@frappe.io and contributors
 # For license information, please see license.txt
 
-# import frappe
+import frappe
 from frappe.model.document import Document
+from support.frappe_support.doctype.support_provider_team.support_provider_team import (
+	get_rule_name,
+	set_rule_status,
+)
 
 
 class SupportProvider(Document):
-	pass
+	def on_update(self):
+		if self.has_value_changed("assignment_mode"):
+			self.update_assignment_rules()
+
+	def update_assignment_rules(self):
+		# the rules read the mode through the document cache
+		frappe.clear_document_cache(self.doctype, self.name)
+		for team in frappe.get_all(
+			"Support Provider Team", filters={"support_provider": self.name}, pluck="name"
+		):
+			if rule_name := get_rule_name(self.name, team):
+				has_users = frappe.db.exists("Assignment Rule User", {"parent": rule_name})
+				set_rule_status(self.name, rule_name, has_users=bool(has_users))
@@ -2,33 +2,52 @@
 # For license information, please see license.txt
 
 import frappe
+from frappe.cache_manager import clear_doctype_map
 from frappe.model.document import Document
+from support.assignment import uses_assignment_rule
+from support.session import clear_session_cache
+from support.utils import admin_session, delete_child_rows, insert_child_row
 
 
 class SupportProviderTeam(Document):
     def on_update(self):
-        old_user = frappe.session.user
-        frappe.set_user("Administrator")
-
-        rule_name = self.get_rule_name()
-        if rule_name:
-            rule = frappe.get_doc("Assignment Rule", rule_name)
-            rule.users = []
-            for member in self.members:
-                rule.append("users", {"user": member.user})
-            rule.save(ignore_permissions=True)
+        self.clear_member_sessions()
+
+        with admin_session():
+            self.sync_assignment_rule()
+
+    def on_trash(self):
+        self.clear_member_sessions()
+
+    def clear_member_sessions(self):
+        emails = [member.user for member in self.members]
+        if previous := self.get_doc_before_save():
+            emails += [member.user for member in previous.members]
+        clear_session_cache(emails=emails)
+
+    def sync_assignment_rule(self):
+        if not self.get_rule_name():
+            self.create_assignment_rule()
             return
 
-        self.create_assignment_rule()
+        active = get_active_members(self)
+        previous = self.get_doc_before_save()
+        previous_active = get_active_members(previous) if previous else set()
+        if active == previous_active:
+            return
 
-        frappe.set_user(old_user)
+        update_rule_users(
+            self.support_provider,
+            self.name,
+            add=active - previous_active,
+            remove=previous_active - active,
+        )
 
     def create_assignment_rule(self):
         rule = frappe.new_doc("Assignment Rule")
         rule.name = f"{self.support_provider} - {self.name}"
         rule.document_type = "Issue"
         rule.priority = 1
-        rule.disabled = 0
         rule.description = "Automatic Assignment"
         rule.assign_condition = (
             f'status=="Open" and support_provider=="{self.support_provider}"'
@@ -37,6 +56,12 @@ class SupportProviderTeam(Document):
         rule.close_condition = 'status == "Closed"'
         rule.rule = "Round Robin"
         rule.users = []
+        for user in get_active_members(self):
+            rule.append("users", {"user": user})
+        # a rule without users fails on every new ticket
+        rule.disabled = (
+            0 if rule.users and uses_assignment_rule(self.support_provider) else 1
+        )
         days = [
             "Monday",
             "Tuesday",
@@ -51,6 +76,63 @@ class SupportProviderTeam(Document):
         rule.save(ignore_permissions=True)
 
     def get_rule_name(self):
-        return frappe.db.get_value(
-            "Assignment Rule", f"{self.support_provider} - {self.name}", "name"
+        return get_rule_name(self.support_provider, self.name)
+
+
+def get_rule_name(support_provider, team):
+    return frappe.db.get_value(
+        "Assignment Rule", f"{support_provider} - {team}", "name"
+    )
+
+
+def get_active_members(team):
+    return {member.user for member in team.members if not member.disabled}
+
+
+def add_member(team, user):
+    """Add `user` to the team and its assignment rule without saving either document."""
+    insert_child_row("Support Provider Team", team, "members", {"user": user})
+    clear_session_cache(emails=[user])
+
+    support_provider = frappe.db.get_value(
+        "Support Provider Team", team, "support_provider"
+    )
+    update_rule_users(support_provider, team, add=[user])
+
+
+def update_rule_users(support_provider, team, add=(), remove=()):
+    """Add and remove round robin users of the team's assignment rule, row by row."""
+    rule_name = get_rule_name(support_provider, team)
+    if not rule_name:
+        # the rule is created with all active members on the next save of the team
+        return
+
+    current = set(
+        frappe.get_all(
+            "Assignment Rule User", filters={"parent": rule_name}, pluck="user"
         )
+    )
+    add = [user for user in add if user not in current]
+    remove = [user for user in remove if user in current]
+    if not add and not remove:
+        return
+
+    for user in add:
+        insert_child_row("Assignment Rule", rule_name, "users", {"user": user})
+    if remove:
+        delete_child_rows(
+            "Assignment Rule", rule_name, "users", {"user": ("in", remove)}
+        )
+
+    remaining = current.union(add).difference(remove)
+    set_rule_status(support_provider, rule_name, has_users=bool(remaining))
+
+
+def set_rule_status(support_provider, rule_name, has_users=True):
+    """Enable the rule only for round robin providers and only while it has users."""
+    disabled = 0 if has_users and uses_assignment_rule(support_provider) else 1
+    frappe.db.set_value(
+        "Assignment Rule", rule_name, "disabled", disabled, update_modified=False
+    )
+    # what AssignmentRule.on_update would have cleared
+    clear_doctype_map("Assignment Rule", "Issue")
@@ -1,9 +1,142 @@
 # Copyright (c) 2023, developers@frappe.io and Contributors
 # See license.txt
 
-# import frappe
+from unittest.mock import patch
+
+import frappe
+from frappe.desk.form.assign_to import close_all_assignments
 from frappe.tests.utils import FrappeTestCase
+from support.assignment import LEAST_OPEN_TICKETS, WEIGHTED, get_assignee
+from support.dashboard import get_summary, rebuild_dashboard_counters
+from support.frappe_support.doctype.support_provider_team.support_provider_team import (
+	add_member,
+)
 
 
 class TestSupportProviderTeam(FrappeTestCase):
-	pass
+	def setUp(self):
+		for email in ("one@example.com", "two@example.com"):
+			if not frappe.db.exists("User", email):
+				frappe.get_doc(
+					{"doctype": "User", "email": email, "first_name": email.split("@")[0]}
+				).insert(ignore_permissions=True)
+		if not frappe.db.exists("Support Provider", "Test Provider"):
+			frappe.get_doc(
+				{"doctype": "Support Provider", "__newname": "Test Provider"}
+			).insert(ignore_permissions=True)
+
+	def get_rule_users(self, team):
+		return set(
+			frappe.get_all(
+				"Assignment Rule User", filters={"parent": team.get_rule_name()}, pluck="user"
+			)
+		)
+
+	def test_assignment_rule_follows_active_members(self):
+		team = frappe.get_doc(
+			{
+				"doctype": "Support Provider Team",
+				"team_name": "Rule Sync",
+				"support_provider": "Test Provider",
+				"members": [{"user": "one@example.com"}, {"user": "two@example.com"}],
+			}
+		).insert(ignore_permissions=True)
+		self.assertEqual(self.get_rule_users(team), {"one@example.com", "two@example.com"})
+
+		team.members[1].disabled = 1
+		team.save(ignore_permissions=True)
+		self.assertEqual(self.get_rule_users(team), {"one@example.com"})
+
+		modified = frappe.db.get_value("Assignment Rule", team.get_rule_name(), "modified")
+		team.save(ignore_permissions=True)
+		self.assertEqual(
+			frappe.db.get_value("Assignment Rule", team.get_rule_name(), "modified"), modified
+		)
+
+	def test_member_added_from_portal_is_weighted(self):
+		frappe.get_doc(
+			{
+				"doctype": "Support Provider",
+				"__newname": "Weighted Provider",
+				"assignment_mode": WEIGHTED,
+			}
+		).insert(ignore_permissions=True)
+		team = frappe.get_doc(
+			{
+				"doctype": "Support Provider Team",
+				"team_name": "Weighted Team",
+				"support_provider": "Weighted Provider",
+				"members": [{"user": "one@example.com"}],
+			}
+		).insert(ignore_permissions=True)
+
+		add_member(team.name, "two@example.com")
+		self.assertEqual(
+			frappe.db.get_value(
+				"Support Team Member", {"parent": team.name, "user": "two@example.com"}, "weight"
+			),
+			1,
+		)
+		self.assertEqual(
+			get_assignee("Weighted Provider", exclude=["one@example.com"]), "two@example.com"
+		)
+
+	def test_open_tickets_count_per_provider(self):
+		teams = {}
+		for provider in ("Counting Provider", "Other Provider"):
+			if not frappe.db.exists("Support Provider", provider):
+				frappe.get_doc({"doctype": "Support Provider", "__newname": provider}).insert(
+					ignore_permissions=True
+				)
+			# assigned on insert by support.assignment, not by an Assignment Rule
+			support_provider = frappe.get_doc("Support Provider", provider)
+			support_provider.assignment_mode = LEAST_OPEN_TICKETS
+			support_provider.save(ignore_permissions=True)
+			teams[provider] = frappe.get_doc(
+				{
+					"doctype": "Support Provider Team",
+					"team_name": f"{provider} Team",
+					"support_provider": provider,
+					"members": [{"user": "one@example.com"}],
+				}
+			).insert(ignore_permissions=True)
+		if not frappe.db.exists("Supported Site", "counting.example.com"):
+			frappe.get_doc(
+				{
+					"doctype": "Supported Site",
+					"site_name": "counting.example.com",
+					"support_provider": "Counting Provider",
+				}
+			).insert(ignore_permissions=True)
+
+		def get_open_tickets(provider):
+			return get_summary(provider, "Agent", "one@example.com").open
+
+		issue = frappe.get_doc(
+			{
+				"doctype": "Issue",
+				"subject": "Open ticket counter",
+				"raised_by": "user@example.com",
+				"site_name": "counting.example.com",
+				"support_provider": "Counting Provider",
+			}
+		).insert(ignore_permissions=True)
+		self.assertEqual(
+			frappe.parse_json(frappe.db.get_value("Issue", issue.name, "_assign")),
+			["one@example.com"],
+		)
+		self.assertEqual(get_open_tickets("Counting Provider"), 1)
+		self.assertEqual(get_open_tickets("Other Provider"), 0)
+
+		# saving the roster leaves the counters alone
+		teams["Counting Provider"].reload().save(ignore_permissions=True)
+		self.assertEqual(get_open_tickets("Counting Provider"), 1)
+
+		# a rebuild arrives at the same counts
+		with patch.object(frappe.db, "commit"):
+			rebuild_dashboard_counters()
+		self.assertEqual(get_open_tickets("Counting Provider"), 1)
+		self.assertEqual(get_open_tickets("Other Provider"), 0)
+
+		close_all_assignments("Issue", issue.name)
+		self.assertEqual(get_open_tickets("Counting Provider"), 0)
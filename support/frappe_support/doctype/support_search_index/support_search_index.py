@@ -0,0 +1,9 @@
+# Copyright (c) 2023, developers@frappe.io and contributors
+# For license information, please see license.txt
+
+# import frappe
+from frappe.model.document import Document
+
+
+class SupportSearchIndex(Document):
+	pass
@@ -0,0 +1,104 @@
+# Copyright (c) 2023, developers@frappe.io and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from support.search import SEARCH_INDEX, search_tickets
+
+SITE_NAME = "searchable.example.com"
+
+
+class TestSupportSearchIndex(FrappeTestCase):
+	def setUp(self):
+		if not frappe.db.exists("Support Provider", "Search Provider"):
+			frappe.get_doc(
+				{"doctype": "Support Provider", "__newname": "Search Provider"}
+			).insert(ignore_permissions=True)
+		if not frappe.db.exists("Supported Site", SITE_NAME):
+			frappe.get_doc(
+				{
+					"doctype": "Supported Site",
+					"site_name": SITE_NAME,
+					"support_provider": "Search Provider",
+				}
+			).insert(ignore_permissions=True)
+		self.issues = []
+
+	def tearDown(self):
+		# full-text indexes only see committed rows, the tests commit theirs
+		for issue_name in self.issues:
+			frappe.db.delete("Communication", {"reference_name": issue_name})
+			frappe.db.delete(SEARCH_INDEX, {"name": issue_name})
+			frappe.db.delete("Issue", {"name": issue_name})
+		frappe.db.commit()
+
+	def make_issue(self, subject):
+		issue = frappe.get_doc(
+			{
+				"doctype": "Issue",
+				"subject": subject,
+				"raised_by": "user@example.com",
+				"site_name": SITE_NAME,
+				"support_provider": "Search Provider",
+			}
+		).insert(ignore_permissions=True)
+		self.issues.append(issue.name)
+		return issue
+
+	def add_reply(self, issue, content):
+		return frappe.get_doc(
+			{
+				"doctype": "Communication",
+				"communication_type": "Communication",
+				"communication_medium": "Email",
+				"sent_or_received": "Received",
+				"subject": f"Re: {issue.subject}",
+				"content": content,
+				"reference_doctype": "Issue",
+				"reference_name": issue.name,
+			}
+		).insert(ignore_permissions=True)
+
+	def search(self, text):
+		return [
+			match.name for match in search_tickets(text, site_names=[SITE_NAME])
+		]
+
+	def test_index_follows_inserts(self):
+		issue = self.make_issue("Backup restore fails")
+		entry = frappe.db.get_value(
+			SEARCH_INDEX, issue.name, ["subject", "site_name", "content"], as_dict=True
+		)
+		self.assertEqual(entry.subject, "Backup restore fails")
+		self.assertEqual(entry.site_name, SITE_NAME)
+		self.assertFalse(entry.content)
+
+		self.add_reply(issue, "<p>The archive is &quot;corrupted&quot;</p>")
+		self.assertEqual(
+			frappe.db.get_value(SEARCH_INDEX, issue.name, "content"),
+			'The archive is "corrupted"',
+		)
+
+	def test_fulltext_match(self):
+		subject_match = self.make_issue("Invoice printing hangs")
+		reply_match = self.make_issue("Slow reports")
+		self.add_reply(reply_match, "Printing an invoice takes minutes")
+		other = self.make_issue("Password reset")
+		frappe.db.commit()
+
+		# subject matches rank above reply matches, the last word is a prefix
+		self.assertEqual(
+			self.search("invoice print"), [subject_match.name, reply_match.name]
+		)
+		self.assertNotIn(other.name, self.search("invoice"))
+
+	def test_short_terms_fall_back_to_like(self):
+		issue = self.make_issue("DB migration stuck")
+		self.make_issue("Email not sent")
+
+		self.assertEqual(self.search("db"), [issue.name])
+
+	def test_site_name_match(self):
+		issue = self.make_issue("Cannot login")
+
+		self.assertEqual(self.search("searchable"), [issue.name])
@@ -1,9 +1,23 @@
 # Copyright (c) 2023, developers@frappe.io and contributors
 # For license information, please see license.txt
 
-# import frappe
+import frappe
 from frappe.model.document import Document
+from frappe.utils import now_datetime
+from support.session import clear_session_cache
 
 
 class SupportSession(Document):
-	pass
+	def on_update(self):
+		previous = self.get_doc_before_save()
+		if previous and previous.key != self.key:
+			clear_session_cache(key=previous.key)
+		clear_session_cache(key=self.key)
+
+	def on_trash(self):
+		clear_session_cache(key=self.key)
+
+
+def clear_expired_sessions():
+	"""Delete expired session keys, runs hourly via `scheduler_events`."""
+	frappe.db.delete("Support Session", {"expires_on": ("<", now_datetime())})
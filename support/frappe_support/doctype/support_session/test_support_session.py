@@ -3,7 +3,24 @@
 
 # import frappe
 from frappe.tests.utils import FrappeTestCase
+from support.session import (
+	make_session_token,
+	revoke_session_token,
+	verify_session_token,
+)
 
 
 class TestSupportSession(FrappeTestCase):
-	pass
+	def test_signed_session_token(self):
+		token = make_session_token("agent@example.com", for_agent=True)
+		payload = verify_session_token(token)
+		self.assertEqual(payload.email, "agent@example.com")
+		self.assertEqual(payload.role, "agent")
+
+		body, _, signature = token.partition(".")
+		self.assertIsNone(verify_session_token(f"{body}.{signature[::-1]}"))
+
+	def test_revoked_session_token(self):
+		token = make_session_token("customer@example.com")
+		revoke_session_token(token)
+		self.assertIsNone(verify_session_token(token))
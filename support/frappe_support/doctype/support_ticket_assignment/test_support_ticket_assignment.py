@@ -0,0 +1,38 @@
+# Copyright (c) 2023, developers@frappe.io and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from support.assignment import add_to_assignment_index, remove_from_assignment_index
+
+
+class TestSupportTicketAssignment(FrappeTestCase):
+	def setUp(self):
+		if not frappe.db.exists("User", "assignee@example.com"):
+			frappe.get_doc(
+				{"doctype": "User", "email": "assignee@example.com", "first_name": "Assignee"}
+			).insert(ignore_permissions=True)
+		self.issue = frappe.get_doc(
+			{"doctype": "Issue", "subject": "Assignment index", "raised_by": "user@example.com"}
+		).insert(ignore_permissions=True)
+
+	def get_rows(self):
+		return frappe.get_all(
+			"Support Ticket Assignment",
+			filters={"issue": self.issue.name, "user": "assignee@example.com"},
+		)
+
+	def test_index_once_per_assignee(self):
+		add_to_assignment_index(self.issue.name, "assignee@example.com")
+		add_to_assignment_index(self.issue.name, "assignee@example.com")
+		self.assertEqual(len(self.get_rows()), 1)
+
+		# another request indexed it between the check and the insert
+		with patch("support.assignment.is_assigned", return_value=False):
+			add_to_assignment_index(self.issue.name, "assignee@example.com")
+		self.assertEqual(len(self.get_rows()), 1)
+
+		remove_from_assignment_index(self.issue.name, "assignee@example.com")
+		self.assertEqual(self.get_rows(), [])
@@ -1,9 +1,19 @@
 # Copyright (c) 2023, developers@frappe.io and contributors
 # For license information, please see license.txt
 
-# import frappe
 from frappe.model.document import Document
+from support.session import clear_session_cache
 
 
 class SupportedSite(Document):
-	pass
+	def on_update(self):
+		self.clear_user_sessions()
+
+	def on_trash(self):
+		self.clear_user_sessions()
+
+	def clear_user_sessions(self):
+		emails = [user.email for user in self.support_users]
+		if previous := self.get_doc_before_save():
+			emails += [user.email for user in previous.support_users]
+		clear_session_cache(emails=emails)
@@ -75,7 +75,7 @@ website_route_rules = [
 # ------------
 
 # before_install = "support.install.before_install"
-# after_install = "support.install.after_install"
+after_install = "support.install.after_install"
 
 # Uninstallation
 # ------------
@@ -113,34 +113,62 @@ website_route_rules = [
 # ---------------
 # Hook on document methods and events
 
-# doc_events = {
-#	"*": {
-#		"on_update": "method",
-#		"on_cancel": "method",
-#		"on_trash": "method"
-#	}
-# }
+doc_events = {
+    "Issue": {
+        "on_update": [
+            "support.dashboard.update_issue_counters",
+            "support.search.update_issue_index",
+            "support.realtime.publish_issue_update",
+            "support.assignment.on_issue_update",
+            "support.work_queue.update_work_queue",
+        ],
+        "on_trash": [
+            "support.dashboard.update_issue_counters",
+            "support.search.delete_issue_index",
+            "support.assignment.delete_assignment_index",
+            "support.work_queue.update_work_queue",
+        ],
+    },
+    "ToDo": {
+        "on_update": [
+            "support.assignment.update_assignment_index",
+            "support.dashboard.update_agent_counters",
+            "support.work_queue.update_work_queue_from_todo",
+        ],
+        "on_trash": [
+            "support.assignment.update_assignment_index",
+            "support.dashboard.update_agent_counters",
+            "support.work_queue.update_work_queue_from_todo",
+        ],
+    },
+    "Communication": {
+        "after_insert": [
+            "support.search.update_communication_index",
+            "support.realtime.publish_communication_update",
+        ],
+        "on_update": ["support.render.render_communication"],
+    },
+}
 
 # Scheduled Tasks
 # ---------------
 
-# scheduler_events = {
-#	"all": [
-#		"support.tasks.all"
-#	],
-#	"daily": [
-#		"support.tasks.daily"
-#	],
-#	"hourly": [
-#		"support.tasks.hourly"
-#	],
-#	"weekly": [
-#		"support.tasks.weekly"
-#	],
-#	"monthly": [
-#		"support.tasks.monthly"
-#	],
-# }
+scheduler_events = {
+    "hourly": [
+        "support.frappe_support.doctype.support_session.support_session.clear_expired_sessions",
+    ],
+    "daily": [
+        "support.dashboard.rebuild_dashboard_counters",
+    ],
+    "cron": {
+        "* * * * *": [
+            "support.replica.measure_replica_lag",
+        ],
+        "*/5 * * * *": [
+            "support.sla.check_sla",
+        ],
+    },
+}
 
 # Testing
 # -------
@@ -0,0 +1,56 @@
+# Copyright (c) 2023, developers@frappe.io and contributors
+# For license information, please see license.txt
+
+import frappe
+from support.search import add_search_indexes
+
+
+def after_install():
+    add_issue_indexes()
+    add_sla_indexes()
+    add_assignment_indexes()
+    add_dashboard_indexes()
+    add_search_indexes()
+
+
+def add_issue_indexes():
+    # customer ticket list filters on exact site names, agents list by provider
+    frappe.db.add_index(
+        "Issue", ["site_name", "status", "creation"], "site_name_status_creation_index"
+    )
+    frappe.db.add_index(
+        "Issue", ["support_provider", "creation"], "support_provider_creation_index"
+    )
+
+
+def add_sla_indexes():
+    # the SLA check reads due tickets per provider and status in deadline order
+    frappe.db.add_index(
+        "Issue",
+        ["support_provider", "status", "response_by"],
+        "support_provider_status_response_by_index",
+    )
+    frappe.db.add_index(
+        "Issue",
+        ["support_provider", "status", "resolution_by"],
+        "support_provider_status_resolution_by_index",
+    )
+
+
+def add_assignment_indexes():
+    # "assigned to" lists look up a user's tickets within a provider
+    frappe.db.add_index(
+        "Support Ticket Assignment",
+        ["user", "support_provider"],
+        "user_support_provider_index",
+    )
+    frappe.db.add_unique("Support Ticket Assignment", ["issue", "user"])
+
+
+def add_dashboard_indexes():
+    # a summary reads all counters of one scope
+    frappe.db.add_index(
+        "Support Dashboard Counter",
+        ["support_provider", "scope", "scope_name"],
+        "support_provider_scope_index",
+    )
@@ -0,0 +1,179 @@
+# Copyright (c) 2023, developers@frappe.io and contributors
+# For license information, please see license.txt
+
+import functools
+
+import frappe
+
+# how long the status of a queued mail can be looked up
+MAIL_STATUS_TTL = 24 * 60 * 60
+
+SLA_ACK_QUEUE = "support_sla_ack_queue"
+SLA_ACK_FLUSH_SCHEDULED = "support_sla_ack_flush_scheduled"
+
+
+def queue_mail(method, dedupe_key=None, dedupe_window=60, **kwargs):
+    """Send a mail through `method(**kwargs)` in a background job, return its mail id.
+
+    Mails queued with the same `dedupe_key` within `dedupe_window` seconds are
+    coalesced into the first one, whose mail id is returned instead.
+    """
+    if dedupe_key:
+        if mail_id := frappe.cache().get_value(f"support_mail_dedupe:{dedupe_key}"):
+            return mail_id
+
+    mail_id = frappe.generate_hash(length=16)
+    set_mail_status(mail_id, "Queued")
+    if dedupe_key:
+        frappe.cache().set_value(
+            f"support_mail_dedupe:{dedupe_key}", mail_id, expires_in_sec=dedupe_window
+        )
+        # the job is only enqueued on commit, don't swallow retries of a rollback
+        frappe.db.after_rollback.add(
+            functools.partial(
+                frappe.cache().delete_value, f"support_mail_dedupe:{dedupe_key}"
+            )
+        )
+
+    frappe.enqueue(
+        "support.outbox.send_queued_mail",
+        queue="short",
+        enqueue_after_commit=True,
+        mail_id=mail_id,
+        method=method,
+        kwargs=kwargs,
+    )
+    return mail_id
+
+
+def send_queued_mail(mail_id, method, kwargs):
+    set_mail_status(mail_id, "Sending")
+    try:
+        frappe.get_attr(method)(**kwargs)
+    except Exception:
+        set_mail_status(mail_id, "Error")
+        frappe.log_error(title="Support mail failed")
+        raise
+    set_mail_status(mail_id, "Sent")
+
+
+def queue_mail_batch(method, batch):
+    """Send one mail per kwargs dict in `batch` from a single background job.
+
+    Returns the batch id, `get_batch_status` reports how many were sent so far.
+    """
+    batch_id = frappe.generate_hash(length=16)
+    set_batch_status(batch_id, total=len(batch), sent=0, failed=0, status="Queued")
+    frappe.enqueue(
+        "support.outbox.send_mail_batch",
+        queue="long",
+        enqueue_after_commit=True,
+        batch_id=batch_id,
+        method=method,
+        batch=batch,
+    )
+    return batch_id
+
+
+def send_mail_batch(batch_id, method, batch):
+    send = frappe.get_attr(method)
+    status = frappe._dict(total=len(batch), sent=0, failed=0, status="Sending")
+    for i, kwargs in enumerate(batch):
+        try:
+            send(**kwargs)
+            # keep what was already mailed if the job dies half way
+            frappe.db.commit()
+            status.sent += 1
+        except Exception:
+            frappe.db.rollback()
+            status.failed += 1
+            frappe.log_error(title="Support mail failed")
+        if i % 20 == 0:
+            set_batch_status(batch_id, **status)
+    status.status = "Sent" if not status.failed else "Partially Sent"
+    set_batch_status(batch_id, **status)
+
+
+def get_batch_status(batch_id):
+    return frappe.cache().get_value(f"support_mail_batch:{batch_id}")
+
+
+def set_batch_status(batch_id, **status):
+    frappe.cache().set_value(
+        f"support_mail_batch:{batch_id}", status, expires_in_sec=MAIL_STATUS_TTL
+    )
+
+
+def get_mail_status(mail_id):
+    return frappe.cache().get_value(f"support_mail:{mail_id}")
+
+
+def set_mail_status(mail_id, status):
+    frappe.cache().set_value(
+        f"support_mail:{mail_id}", status, expires_in_sec=MAIL_STATUS_TTL
+    )
+
+
+def queue_sla_ack(issue_name):
+    """Queue the acknowledgement of a new ticket, acks are sent in batches.
+
+    A flush job is only enqueued when none is pending, acks queued meanwhile
+    go out with that job. Acks of rolled back tickets are skipped by the flush.
+    """
+    cache = frappe.cache()
+    cache.rpush(SLA_ACK_QUEUE, issue_name)
+    if cache.get_value(SLA_ACK_FLUSH_SCHEDULED):
+        return
+    cache.set_value(SLA_ACK_FLUSH_SCHEDULED, 1, expires_in_sec=10 * 60)
+    frappe.db.after_rollback.add(reschedule_sla_ack_flush)
+    frappe.enqueue(
+        "support.outbox.flush_sla_acks", queue="short", enqueue_after_commit=True
+    )
+
+
+def reschedule_sla_ack_flush():
+    """Release the flush flag of a rolled back request, its job was never enqueued.
+
+    Acks other requests queued while the flag was set still need a job.
+    """
+    cache = frappe.cache()
+    cache.delete_value(SLA_ACK_FLUSH_SCHEDULED)
+    if cache.llen(SLA_ACK_QUEUE):
+        cache.set_value(SLA_ACK_FLUSH_SCHEDULED, 1, expires_in_sec=10 * 60)
+        frappe.enqueue("support.outbox.flush_sla_acks", queue="short")
+
+
+def flush_sla_acks():
+    from support.www.support.portal import email_sla_info
+
+    cache = frappe.cache()
+    cache.delete_value(SLA_ACK_FLUSH_SCHEDULED)
+    issue_names = []
+    while issue_name := cache.lpop(SLA_ACK_QUEUE):
+        issue_names.append(frappe.safe_decode(issue_name))
+    if not issue_names:
+        return
+
+    issues = frappe.get_all(
+        "Issue",
+        filters={"name": ("in", issue_names)},
+        fields=["name", "subject", "raised_by"],
+    )
+    for issue in issues:
+        try:
+            email_sla_info(issue)
+        except Exception:
+            frappe.log_error(title=f"Support SLA mail failed for {issue.name}")
+
+
+def send_communication(
+    communication, print_html="", print_format="", print_letterhead=1, send_me_a_copy=0
+):
+    """Mail a Communication saved with `send_email=0`, with the print options the
+    portal passes to `create_communication`."""
+    frappe.get_doc("Communication", communication).send_email(
+        print_html=print_html,
+        print_format=print_format,
+        print_letterhead=print_letterhead,
+        send_me_a_copy=send_me_a_copy,
+    )
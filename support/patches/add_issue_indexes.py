@@ -0,0 +1,5 @@
+from support.install import add_issue_indexes
+
+
+def execute():
+    add_issue_indexes()
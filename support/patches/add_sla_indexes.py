@@ -0,0 +1,5 @@
+from support.install import add_sla_indexes
+
+
+def execute():
+    add_sla_indexes()
@@ -0,0 +1,7 @@
+from support.dashboard import rebuild_dashboard_counters
+from support.install import add_dashboard_indexes
+
+
+def execute():
+    add_dashboard_indexes()
+    rebuild_dashboard_counters()
@@ -0,0 +1,6 @@
+from support.search import add_search_indexes, rebuild_search_index
+
+
+def execute():
+    add_search_indexes()
+    rebuild_search_index()
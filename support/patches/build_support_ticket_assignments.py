@@ -0,0 +1,7 @@
+from support.assignment import rebuild_assignment_index
+from support.install import add_assignment_indexes
+
+
+def execute():
+    add_assignment_indexes()
+    rebuild_assignment_index()
@@ -0,0 +1,95 @@
+import frappe
+from support.session import clear_session_cache
+from support.www.support.portal import canonicalize_site_name
+
+
+def execute():
+    """Rewrite stored site names to the bare host names tickets are matched on.
+
+    Sites that only differ by scheme, case or path are merged into one, keeping
+    the users of all of them.
+    """
+    SupportedSite = frappe.qb.DocType("Supported Site")
+    SupportedSiteUser = frappe.qb.DocType("Supported Site User")
+
+    sites = frappe.get_all(
+        "Supported Site", fields=["name", "support_provider"], order_by="creation asc"
+    )
+    groups = {}
+    for site in sites:
+        groups.setdefault(canonicalize_site_name(site.name), []).append(site)
+
+    emails = []
+    for canonical, group in groups.items():
+        if len(group) == 1 and group[0].name == canonical:
+            continue
+
+        # keep the site already stored under the canonical name, else the oldest
+        keeper = next((site for site in group if site.name == canonical), group[0])
+        users = frappe.get_all(
+            "Supported Site User",
+            filters={"parenttype": "Supported Site", "parent": keeper.name},
+            pluck="email",
+        )
+        kept_emails = {email.lower() for email in users if email}
+        support_provider = keeper.support_provider
+
+        for site in group:
+            if site is keeper:
+                continue
+            for row in frappe.get_all(
+                "Supported Site User",
+                filters={"parenttype": "Supported Site", "parent": site.name},
+                fields=["name", "email"],
+            ):
+                emails.append(row.email)
+                if row.email and row.email.lower() not in kept_emails:
+                    kept_emails.add(row.email.lower())
+                    frappe.db.set_value(
+                        "Supported Site User",
+                        row.name,
+                        "parent",
+                        keeper.name,
+                        update_modified=False,
+                    )
+                else:
+                    frappe.db.delete("Supported Site User", {"name": row.name})
+            support_provider = support_provider or site.support_provider
+            frappe.db.delete("Supported Site", {"name": site.name})
+
+        # names compare case-insensitively, update in place instead of renaming
+        (
+            frappe.qb.update(SupportedSite)
+            .set(SupportedSite.name, canonical)
+            .set(SupportedSite.site_name, canonical)
+            .set(SupportedSite.support_provider, support_provider)
+            .where(SupportedSite.name == keeper.name)
+        ).run()
+        (
+            frappe.qb.update(SupportedSiteUser)
+            .set(SupportedSiteUser.parent, canonical)
+            .where(
+                (SupportedSiteUser.parenttype == "Supported Site")
+                & (SupportedSiteUser.parent == keeper.name)
+            )
+        ).run()
+        emails += users
+
+    for doctype in ("Issue", "Support Search Index"):
+        # equality ignores case, lower case the names before comparing them
+        frappe.db.sql(
+            f"""update `tab{doctype}` set site_name = lower(site_name)
+            where binary site_name != binary lower(site_name)"""
+        )
+        for site_name in frappe.get_all(doctype, distinct=True, pluck="site_name"):
+            canonical = canonicalize_site_name(site_name)
+            if site_name and canonical != site_name:
+                frappe.db.set_value(
+                    doctype,
+                    {"site_name": site_name},
+                    "site_name",
+                    canonical,
+                    update_modified=False,
+                )
+
+    clear_session_cache(emails=emails)
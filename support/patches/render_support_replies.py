@@ -0,0 +1,8 @@
+from frappe.utils.fixtures import sync_fixtures
+from support.render import rebuild_rendered_replies
+
+
+def execute():
+    # fixtures sync after patches, the custom fields are needed now
+    sync_fixtures("support")
+    rebuild_rendered_replies()
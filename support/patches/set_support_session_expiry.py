@@ -0,0 +1,17 @@
+import frappe
+from frappe.query_builder.functions import Coalesce
+from support.session import get_session_expiry
+
+
+def execute():
+    # existing keys get a full lifetime from now instead of being logged out at once
+    SupportSession = frappe.qb.DocType("Support Session")
+    (
+        frappe.qb.update(SupportSession)
+        .set(
+            SupportSession.issued_on,
+            Coalesce(SupportSession.issued_on, SupportSession.creation),
+        )
+        .set(SupportSession.expires_on, get_session_expiry())
+        .where(SupportSession.expires_on.isnull())
+    ).run()
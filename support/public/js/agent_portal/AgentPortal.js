@@ -34,6 +34,12 @@ const utils = {
 			? "yellow"
 			: "green";
 	},
+	format_size: (bytes) => {
+		if (bytes == null) return "";
+		if (bytes < 1024) return `${bytes} B`;
+		if (bytes < 1024 * 1024) return `${(bytes / 1024).toFixed(1)} KB`;
+		return `${(bytes / 1024 / 1024).toFixed(1)} MB`;
+	},
 
 	store_session_key: (value) => {
 		!value && localStorage.removeItem("support-agent-key");
@@ -73,12 +79,85 @@ const utils = {
 	fetch_agent(session_key) {
 		return frappe
 			.call({
+				// the ticket list loads its first page itself, for its assignee filter
 				method: utils.get_api_url("get_agent"),
 				args: { session_key },
 			})
 			.then((res) => res.message);
 	},
 
+	fetch_tickets(session_key, cursor, assignee, open_or_close) {
+		return frappe
+			.call({
+				method: utils.get_api_url("get_tickets"),
+				args: { session_key, cursor, assignee, open_or_close },
+			})
+			.then((res) => res.message);
+	},
+
+	fetch_changes(session_key, since, issue_name) {
+		return frappe
+			.call({
+				method: utils.get_api_url("get_changes"),
+				args: { session_key, since, issue_name },
+			})
+			.then((res) => res.message);
+	},
+
+	fetch_dashboard(session_key, site_name) {
+		return frappe
+			.call({
+				method: utils.get_api_url("get_dashboard"),
+				args: { session_key, site_name },
+			})
+			.then((res) => res.message);
+	},
+
+	get_next_ticket(session_key) {
+		return frappe
+			.call({
+				method: utils.get_api_url("get_next_ticket"),
+				args: { session_key },
+			})
+			.then((res) => res.message);
+	},
+
+	search_issues(session_key, query) {
+		return frappe
+			.call({
+				method: utils.get_api_url("search_issues"),
+				args: { session_key, query },
+			})
+			.then((res) => res.message);
+	},
+
+	bulk_set_status(session_key, issue_names, status) {
+		return frappe
+			.call({
+				method: utils.get_api_url("bulk_set_status"),
+				args: { session_key, issue_names, status },
+			})
+			.then((res) => res.message);
+	},
+
+	bulk_assign(session_key, issue_names, assignee, remove) {
+		return frappe
+			.call({
+				method: utils.get_api_url("bulk_assign"),
+				args: { session_key, issue_names, assignee, remove },
+			})
+			.then((res) => res.message);
+	},
+
+	bulk_reply(session_key, issue_names, reply) {
+		return frappe
+			.call({
+				method: utils.get_api_url("bulk_reply"),
+				args: { session_key, issue_names, reply },
+			})
+			.then((res) => res.message);
+	},
+
 	add_agent(session_key, new_agent) {
 		return frappe
 			.call({
@@ -124,11 +203,29 @@ const utils = {
 			.then((res) => res.message);
 	},
 
-	reply_to_ticket(session_key, ticket, reply) {
+	fetch_thread_replies(session_key, ticket, cursor) {
+		return frappe
+			.call({
+				method: utils.get_api_url("get_thread_replies"),
+				args: { session_key, issue_name: ticket, cursor, snippets: 1 },
+			})
+			.then((res) => res.message);
+	},
+
+	fetch_reply(session_key, ticket, reply_name) {
+		return frappe
+			.call({
+				method: utils.get_api_url("get_reply"),
+				args: { session_key, issue_name: ticket, reply_name },
+			})
+			.then((res) => res.message);
+	},
+
+	reply_to_ticket(session_key, ticket, reply, idempotency_key) {
 		return frappe
 			.call({
 				method: utils.get_api_url("reply_to_ticket"),
-				args: { session_key, issue_name: ticket, reply },
+				args: { session_key, issue_name: ticket, reply, idempotency_key },
 			})
 			.then((res) => res.message);
 	},
@@ -160,6 +257,24 @@ const utils = {
 			.then((res) => res.message);
 	},
 
+	import_sites(session_key, data) {
+		return frappe
+			.call({
+				method: utils.get_api_url("import_sites"),
+				args: { session_key, data },
+			})
+			.then((res) => res.message);
+	},
+
+	get_import_status(session_key, mail_batch) {
+		return frappe
+			.call({
+				method: utils.get_api_url("get_import_status"),
+				args: { session_key, mail_batch },
+			})
+			.then((res) => res.message);
+	},
+
 	remove_site(session_key, site_name) {
 		return frappe
 			.call({
@@ -206,6 +321,10 @@ function get_session_key() {
 import useRouter from "/assets/support/js/agent_portal/useRouter.js";
 const { reactive, toRefs, provide, defineAsyncComponent } = Vue;
 
+const SYNC_INTERVAL = 30 * 1000;
+// with realtime updates polling only covers missed events
+const REALTIME_SYNC_INTERVAL = 5 * 60 * 1000;
+
 const routes = [
 	{
 		name: "ticket",
@@ -255,6 +374,9 @@ export default {
 			initializing: true,
 			session_key: null,
 			agent: {},
+			watermark: null,
+			// ticket shown by the ticket view, kept in sync along with the list
+			open_ticket: null,
 		});
 
 		provide("app", state);
@@ -270,11 +392,20 @@ export default {
 			}
 
 			utils
-				.fetch_agent(state.session_key)
+				.fetch_changes(state.session_key)
+				.then((changes) => {
+					state.watermark = changes.watermark;
+					subscribe(changes.channels);
+				})
+				.then(() => utils.fetch_agent(state.session_key))
 				.then((agent) => {
 					state.agent = agent;
 					state.initializing = false;
 					router.push(router.route);
+					setInterval(
+						state.sync,
+						frappe.realtime ? REALTIME_SYNC_INTERVAL : SYNC_INTERVAL
+					);
 				})
 				.catch((err) => {
 					console.error(err);
@@ -283,6 +414,58 @@ export default {
 		}
 		initialize();
 
+		state.sync = function () {
+			if (!state.session_key || !state.watermark) return;
+			const open_ticket = state.open_ticket;
+			return utils
+				.fetch_changes(state.session_key, state.watermark, open_ticket?.name)
+				.then((changes) => {
+					state.watermark = changes.watermark;
+					if (!changes.not_modified) apply_changes(changes, open_ticket);
+					// a burst of changes comes in pages, fetch the rest right away
+					if (changes.has_more) return state.sync();
+				});
+		};
+
+		function subscribe(channels) {
+			if (!frappe.realtime) return;
+			// events only name the ticket, fetch the change itself through sync
+			const sync = frappe.utils.debounce(() => state.sync(), 500);
+			channels.forEach((channel) => frappe.realtime.on(`support:${channel}`, sync));
+			// each channel is a room of its own, join again after reconnecting
+			const join = () =>
+				channels.forEach((channel) => frappe.realtime.publish("task_subscribe", channel));
+			join();
+			frappe.realtime.on("connect", join);
+		}
+
+		function apply_changes(changes, open_ticket) {
+			const tickets = state.agent.tickets || [];
+			changes.issues.forEach((ticket) => {
+				const index = tickets.findIndex((t) => t.name == ticket.name);
+				index == -1 ? tickets.unshift(ticket) : (tickets[index] = ticket);
+				if (open_ticket?.name == ticket.name) {
+					open_ticket.status = ticket.status;
+					open_ticket.indicator = utils.get_indicator_color(ticket.status);
+				}
+			});
+
+			const deleted = changes.deleted.map((row) => row.name);
+			state.agent.tickets = tickets.filter((t) => !deleted.includes(t.name));
+			if (!open_ticket) return;
+
+			open_ticket.replies = open_ticket.replies.filter(
+				(reply) => !deleted.includes(reply.name)
+			);
+			changes.replies.forEach((reply) => {
+				const index = open_ticket.replies.findIndex((r) => r.name == reply.name);
+				reply.creation_from_now = utils.get_time_ago(reply.creation);
+				index == -1
+					? open_ticket.replies.unshift(reply)
+					: (open_ticket.replies[index] = reply);
+			});
+		}
+
 		state.logout = function () {
 			state.session_key = null;
 			utils.store_session_key();
@@ -51,12 +51,20 @@ const template = /*html*/ `
 	</div>
 	<div class="mt-5 flex justify-between items-center">
   	<h3 class="mb-3 mt-0 text-xl font-bold">Manage Sites</h3>
-		<a href="#" class="text-sm flex items-center space-x-1" @click="show_add_site_modal">
-			<svg class="icon icon-xs text-muted">
-				<use href="#icon-add"></use>
-			</svg>
-			<span>Add Site</span>
-		</a>
+		<div class="flex items-center space-x-4">
+			<a href="#" class="text-sm flex items-center space-x-1" @click="show_import_sites_modal">
+				<svg class="icon icon-xs text-muted">
+					<use href="#icon-upload"></use>
+				</svg>
+				<span>Import Sites</span>
+			</a>
+			<a href="#" class="text-sm flex items-center space-x-1" @click="show_add_site_modal">
+				<svg class="icon icon-xs text-muted">
+					<use href="#icon-add"></use>
+				</svg>
+				<span>Add Site</span>
+			</a>
+		</div>
 	</div>
 	<div v-if="loading_sites" class="frappe-card p-0">
 		<div class="text-center" style="padding: 5rem">Fetching...</div>
@@ -220,6 +228,58 @@ export default {
 			});
 		}
 
+		function show_import_sites_modal() {
+			const dialog = frappe.msgprint(
+				`<div class="form-group">
+					<div class="clearfix">
+						<label class="text-sm" style="padding-right: 0px;">CSV with site_name and email columns</label>
+					</div>
+					<div class="control-input-wrapper mb-4">
+						<div class="control-input">
+							<textarea class="import-input form-control" style="min-height: 12rem" placeholder="site_name,email&#10;example.com,user@example.com"></textarea>
+						</div>
+					</div>
+				</div>
+				<div class="flex justify-end">
+					<button type="button" class="btn btn-primary btn-sm import-btn">Import</button>
+				</div>`,
+				"Import Sites"
+			);
+
+			dialog.$wrapper.find(".import-btn").on("click", () => {
+				const data = dialog.$wrapper.find(".import-input").val();
+				if (!data.trim()) {
+					frappe.toast("Add at least one row.");
+					return;
+				}
+				utils.import_sites(app.session_key, data).then((result) => {
+					dialog.hide();
+					const errors = result.errors.map(
+						(e) => `<li>${frappe.utils.escape_html(e.site_name || `Row ${e.row}`)}: ${frappe.utils.escape_html(e.error)}</li>`
+					);
+					frappe.msgprint(
+						`<p>${result.sites_created.length} sites created, ${result.users_added} users added.</p>
+						${errors.length ? `<ul>${errors.join("")}</ul>` : ""}`,
+						"Import Sites"
+					);
+					utils.fetch_sites(app.session_key).then((sites) => (state.sites = sites));
+					result.mail_batch && watch_import(result.mail_batch);
+				});
+			});
+		}
+
+		// report once the login links of the imported users are out
+		function watch_import(mail_batch) {
+			utils.get_import_status(app.session_key, mail_batch).then((status) => {
+				if (!status) return;
+				if (["Queued", "Sending"].includes(status.status)) {
+					setTimeout(() => watch_import(mail_batch), 5000);
+					return;
+				}
+				frappe.toast(`Login links sent to ${status.sent} of ${status.total} users.`);
+			});
+		}
+
 		function remove_site(site) {
 			state.sites = state.sites.filter((a) => a.site_name !== site.site_name);
 			utils.remove_site(app.session_key, site.site_name)
@@ -229,6 +289,7 @@ export default {
 			app,
 			show_add_agent_modal,
 			show_add_site_modal,
+			show_import_sites_modal,
 			disable_agent,
 			remove_agent,
 			remove_site,
@@ -98,17 +98,26 @@ const template = /*html*/ `
 						<span>&#149;</span>
 						<span class='text-muted text-sm'> {{reply.creation_from_now}} </span>
 					</div>
-					<div class="text-sm text-gray-700 prose prose-sm">
+					<div class="text-sm text-gray-700 prose prose-sm" v-if="reply.content !== undefined">
 						<p v-html="reply.content"></p>
 					</div>
+					<div class="text-sm text-gray-700 cursor-pointer" v-else @click="expand_reply(reply)">
+						<p>{{ reply.snippet }}</p>
+						<span class="text-muted text-sm">
+							Show full message<template v-if="reply.support_content_size"> ({{ format_size(reply.support_content_size) }})</template>
+						</span>
+					</div>
 				</div>
 			</div>
+			<button class="btn btn-default btn-sm" v-if="ticket.replies_cursor" @click="load_older_replies">
+				Load older replies
+			</button>
 		</div>
 	</div>
 </div>
 `;
 
-const { reactive, toRefs, inject, computed, ref, onMounted } = Vue;
+const { reactive, toRefs, inject, computed, ref, onMounted, onUnmounted } = Vue;
 export default {
 	name: "Ticket",
 	template: template,
@@ -126,6 +135,8 @@ export default {
 			statuses: ["Open", "Replied", "Closed"],
 		});
 
+		onUnmounted(() => (app.open_ticket = null));
+
 		onMounted(() => {
 			tinymce.init({
 				selector: '#reply_content',
@@ -145,20 +156,38 @@ export default {
 				state.ticket = ticket;
 				state.ticket.indicator = utils.get_indicator_color(ticket.status);
 				state.ticket.assignees = JSON.parse(ticket._assign || "[]");
-				state.ticket.replies.forEach((reply) => {
-					reply.bg_color =
-						reply.sent_or_received == "Sent"
-							? "var(--blue-50)"
-							: "var(--gray-100)";
-					reply.creation_from_now = utils.get_time_ago(reply.creation);
-				});
+				state.ticket.replies.forEach(set_reply_details);
 				set_sla_details();
+				app.open_ticket = state.ticket;
 			})
 			.catch((err) => {
 				console.log(err);
 				if (err.message.includes("Invalid Session")) app.logout();
 			});
 
+		function set_reply_details(reply) {
+			reply.bg_color =
+				reply.sent_or_received == "Sent" ? "var(--blue-50)" : "var(--gray-100)";
+			reply.creation_from_now = utils.get_time_ago(reply.creation);
+		}
+
+		// older replies come as snippets, their bodies are fetched when opened
+		function load_older_replies() {
+			utils
+				.fetch_thread_replies(app.session_key, ticket, state.ticket.replies_cursor)
+				.then(({ replies, next_cursor }) => {
+					replies.forEach(set_reply_details);
+					state.ticket.replies = [...state.ticket.replies, ...replies];
+					state.ticket.replies_cursor = next_cursor;
+				});
+		}
+
+		function expand_reply(reply) {
+			utils.fetch_reply(app.session_key, ticket, reply.name).then((message) => {
+				reply.content = message.content;
+			});
+		}
+
 		function set_sla_details() {
 			if (state.ticket.status == "Closed") return;
 			const ticket = state.ticket;
@@ -218,16 +247,20 @@ export default {
 		}
 
 		const reply_content = ref(null);
+		// kept until the reply is posted, so a retried post is not posted twice
+		let reply_key = null;
 		function reply() {
 			const content = tinymce.get('reply_content').getContent();
 			if (!content) return;
+			reply_key = reply_key || frappe.utils.get_random(16);
 			utils
-				.reply_to_ticket(app.session_key, ticket, { content })
+				.reply_to_ticket(app.session_key, ticket, { content }, reply_key)
 				.then((reply) => {
-					console.log(reply);
-					reply.bg_color = "var(--blue-50)";
-					reply.creation_from_now = utils.get_time_ago(reply.creation);
-					state.ticket.replies = [reply, ...state.ticket.replies];
+					reply_key = null;
+					set_reply_details(reply);
+					if (!state.ticket.replies.some((r) => r.name == reply.name)) {
+						state.ticket.replies = [reply, ...state.ticket.replies];
+					}
 					tinymce.get('reply_content').setContent('');
 				})
 				.catch((err) => {
@@ -241,6 +274,9 @@ export default {
 			reply_content,
 			...toRefs(state),
 			reply,
+			load_older_replies,
+			expand_reply,
+			format_size: utils.format_size,
 			set_status: () =>
 				utils
 					.set_status(app.session_key, ticket, state.ticket.status)
@@ -1,7 +1,14 @@
 const template = /*html*/ `
 <div class="d-flex" style="flex-direction: column; height: 100%">
   <h3 class="mb-1 mt-0 text-xl font-bold">Your Tickets</h3>
-  <p class="mb-3 text-muted small">You are logged in as {{ agent.email }}</p>
+  <p class="mb-1 text-muted small">You are logged in as {{ agent.email }}</p>
+  <p v-if="dashboard" class="mb-3 small">
+    <span>{{ dashboard.agent.open }} open with you</span>
+    <span> &#149; {{ dashboard.provider.open }} open in total</span>
+    <span :class="{ 'text-danger': dashboard.provider.overdue }">
+      &#149; {{ dashboard.provider.overdue }} overdue
+    </span>
+  </p>
   <div class="d-flex justify-content-between">
     <div
       class="form-group frappe-control input-max-width"
@@ -38,7 +45,7 @@ const template = /*html*/ `
           <option value="Close">Show Close</option>
         </select>
       </div>
-      <div class="btn btn-default btn-sm btn-select-filter" style="height: fit-content">
+      <div class="btn btn-default btn-sm btn-select-filter mr-3" style="height: fit-content">
         <select
           v-model="assignment_filter"
           style="border: none; background: transparent; outline: none"
@@ -47,53 +54,92 @@ const template = /*html*/ `
           <option value="all">Assigned to all</option>
         </select>
       </div>
+      <button
+        class="btn btn-primary btn-sm"
+        style="height: fit-content"
+        :disabled="claiming"
+        @click="next_ticket"
+      >
+        Next ticket
+      </button>
     </div>
   </div>
+  <div v-if="selected.length" class="d-flex items-center mb-2 small">
+    <span class="text-muted mr-3">{{ selected.length }} selected</span>
+    <div class="btn btn-default btn-sm btn-select-filter mr-3">
+      <select
+        style="border: none; background: transparent; outline: none"
+        @change="bulk_set_status"
+      >
+        <option value="" selected disabled>Set status</option>
+        <option v-for="status in statuses" :key="status" :value="status">{{ status }}</option>
+      </select>
+    </div>
+    <div class="btn btn-default btn-sm btn-select-filter mr-3">
+      <select
+        style="border: none; background: transparent; outline: none"
+        @change="bulk_assign"
+      >
+        <option value="" selected disabled>Assign to</option>
+        <option v-for="member in agents" :key="member.email" :value="member.email">
+          {{ member.full_name || member.email }}
+        </option>
+      </select>
+    </div>
+    <button class="btn btn-default btn-sm mr-3" @click="show_bulk_reply_dialog">Reply</button>
+    <a href="#" @click.prevent="selected = []">Clear</a>
+  </div>
   <div v-if="!agent.email" class="frappe-card p-0">
     <div class="text-center" style="padding: 5rem">Fetching...</div>
   </div>
-  <div v-else-if="!tickets?.length" class="frappe-card p-0">
-    <div class="text-center" style="padding: 5rem">No tickets found</div>
-  </div>
-  <div v-else class="frappe-card p-0" style="flex-grow: 1; overflow-y: auto; overflow-x: hidden">
-    <router-link
+  <div v-else class="frappe-card p-0" style="flex-grow: 1; overflow-y: auto; overflow-x: hidden" @scroll="on_scroll">
+    <div v-if="!tickets.length && !loading_more" class="text-center" style="padding: 5rem">No tickets found</div>
+    <div
       v-for="ticket in tickets"
       :key="ticket.name"
-      style="cursor: pointer"
-      class='border-bottom'
-      :to="{ name: 'ticket', props: { ticket: ticket.name } }"
+      class="d-flex items-center border-bottom"
     >
-      <div class='d-flex justify-content-between p-3'>
-          <div class="flex flex-col">
-            <div class="flex items-center space-x-2">
-              <div class="font-bold">{{ticket.subject}}</div>
-              <span class='indicator-pill pull-right' :class=[ticket.indicator]>
-                <span>{{ticket.status}}</span>
-              </span>
-            </div>
-            <div class="flex items-center space-x-1">
-              <span class="text-muted text-sm">{{ticket.name}}</span>
-              <span>&#149;</span>
-              <span class='text-muted text-sm' :title="ticket.creation">{{ticket.creation_from_now}}</span>
-            </div>
-          </div>
-          <div class="d-flex items-center space-x-4">
-            <div class="flex -space-x-0.5">
-              <dd v-for="assignee in ticket.assignees" :key="assignee">
-                <div class="h-8 w-8 rounded-full bg-green-50 ring-2 ring-white flex items-center justify-center text-sm uppercase" :title="assignee">
-                  {{ assignee[0] }}
-                </div>
-              </dd>
+      <input type="checkbox" class="ml-3" v-model="selected" :value="ticket.name" />
+      <router-link
+        style="cursor: pointer; flex-grow: 1"
+        :to="{ name: 'ticket', props: { ticket: ticket.name } }"
+      >
+        <div class='d-flex justify-content-between p-3'>
+            <div class="flex flex-col">
+              <div class="flex items-center space-x-2">
+                <div class="font-bold">{{ticket.subject}}</div>
+                <span class='indicator-pill pull-right' :class=[ticket.indicator]>
+                  <span>{{ticket.status}}</span>
+                </span>
+              </div>
+              <div class="flex items-center space-x-1">
+                <span class="text-muted text-sm">{{ticket.name}}</span>
+                <span>&#149;</span>
+                <span class='text-muted text-sm' :title="ticket.creation">{{ticket.creation_from_now}}</span>
+              </div>
             </div>
-            <div class="text-sm space-x-1">
-              <svg class="icon icon-sm text-muted">
-                <use href="#icon-comment"></use>
-              </svg>
-              <span>{{ticket.comments.length}}</span>
+            <div class="d-flex items-center space-x-4">
+              <div class="flex -space-x-0.5">
+                <dd v-for="assignee in ticket.assignees" :key="assignee">
+                  <div class="h-8 w-8 rounded-full bg-green-50 ring-2 ring-white flex items-center justify-center text-sm uppercase" :title="assignee">
+                    {{ assignee[0] }}
+                  </div>
+                </dd>
+              </div>
+              <div class="text-sm space-x-1">
+                <svg class="icon icon-sm text-muted">
+                  <use href="#icon-comment"></use>
+                </svg>
+                <span>{{ticket.comments.length}}</span>
+              </div>
             </div>
-          </div>
-      </div>
-    </router-link>
+        </div>
+      </router-link>
+    </div>
+    <div v-if="loading_more" class="text-center text-muted p-3">Fetching...</div>
+    <div v-else-if="agent.next_cursor && !search_results" class="text-center p-3">
+      <button class="btn btn-default btn-sm" @click="load_more">Load more</button>
+    </div>
   </div>
   <div class="mt-6 text-center space-x-1">
     <router-link :to="{ name: 'settings' }">Settings</router-link>
@@ -103,7 +149,7 @@ const template = /*html*/ `
 </div>
 `;
 
-const { toRefs, inject, computed } = Vue;
+const { toRefs, inject, computed, ref, watch } = Vue;
 export default {
 	name: "AgentTickets",
 	template: template,
@@ -111,6 +157,7 @@ export default {
 	setup() {
 		const utils = inject("utils");
 		const app = inject("app");
+		const router = inject("router");
 
 		const agent = computed(() => app.agent);
     const state = utils.use_storage("agent_tickets", {
@@ -119,9 +166,23 @@ export default {
       assignment_filter: "me",
     });
 
+		// while searching, list the ranked matches across all tickets instead
+		const search_results = ref(null);
+		const search = frappe.utils.debounce((search_text) => {
+			if (!search_text) {
+				search_results.value = null;
+				return;
+			}
+			utils
+				.search_issues(app.session_key, search_text)
+				.then((results) => (search_results.value = results));
+		}, 300);
+		watch(() => state.value.search_text, search, { immediate: true });
+
 		const tickets = computed(() => {
-			if (!agent.value.tickets) return [];
-			return agent.value.tickets
+			const source = search_results.value || agent.value.tickets;
+			if (!source) return [];
+			return source
 				.map((ticket) => {
 					return {
 						...ticket,
@@ -140,16 +201,181 @@ export default {
 					if (state.value.status_filter === "Close") {
 						conditions.push(ticket.status === "Closed");
 					}
-					if (state.value.assignment_filter === "me") {
+					if (state.value.assignment_filter === "me" && !search_results.value) {
 						conditions.push(ticket.assignees.includes(agent.value.email));
 					}
 					return conditions.every(Boolean);
 				});
 		});
 
+		// the assignee and status filters run on the server, before paginating
+		const get_filters = () => [
+			state.value.assignment_filter === "me" ? agent.value.email : null,
+			state.value.status_filter === "All" ? null : state.value.status_filter,
+		];
+		const loading_more = ref(false);
+		watch(
+			() => [state.value.assignment_filter, state.value.status_filter, agent.value.email],
+			([_, __, email]) => {
+				if (!email) return;
+				agent.value.tickets = [];
+				agent.value.next_cursor = null;
+				loading_more.value = true;
+				utils
+					.fetch_tickets(app.session_key, null, ...get_filters())
+					.then((page) => {
+						agent.value.tickets = page.tickets;
+						agent.value.next_cursor = page.next_cursor;
+					})
+					.finally(() => (loading_more.value = false));
+			},
+			{ immediate: true }
+		);
+
+		function load_more() {
+			if (loading_more.value || search_results.value) return;
+			if (!agent.value.next_cursor) return;
+
+			loading_more.value = true;
+			utils
+				.fetch_tickets(app.session_key, agent.value.next_cursor, ...get_filters())
+				.then((page) => {
+					agent.value.tickets.push(...page.tickets);
+					agent.value.next_cursor = page.next_cursor;
+				})
+				.finally(() => (loading_more.value = false));
+		}
+
+		function on_scroll(event) {
+			const list = event.target;
+			if (list.scrollTop + list.clientHeight >= list.scrollHeight - 200) {
+				load_more();
+			}
+		}
+
+		const dashboard = ref(null);
+		watch(
+			() => agent.value.email,
+			(email) => {
+				if (!email) return;
+				utils
+					.fetch_dashboard(app.session_key)
+					.then((summary) => (dashboard.value = summary));
+			},
+			{ immediate: true }
+		);
+
+		// tickets checked in the list, for the bulk actions
+		const selected = ref([]);
+		const agents = ref([]);
+		watch(
+			() => agent.value.email,
+			(email) => {
+				if (!email) return;
+				utils.fetch_agents(app.session_key).then((members) => {
+					agents.value = members.filter((member) => !member.disabled);
+				});
+			},
+			{ immediate: true }
+		);
+
+		function update_tickets(names, values) {
+			(agent.value.tickets || []).forEach((ticket) => {
+				if (names.includes(ticket.name)) Object.assign(ticket, values(ticket));
+			});
+		}
+
+		function bulk_set_status(event) {
+			const status = event.target.value;
+			event.target.value = "";
+			utils
+				.bulk_set_status(app.session_key, selected.value, status)
+				.then((statuses) => {
+					update_tickets(Object.keys(statuses), (ticket) => ({
+						status: statuses[ticket.name],
+					}));
+					selected.value = [];
+				});
+		}
+
+		function bulk_assign(event) {
+			const assignee = event.target.value;
+			event.target.value = "";
+			utils
+				.bulk_assign(app.session_key, selected.value, assignee)
+				.then((changed) => {
+					update_tickets(changed, (ticket) => {
+						const assignees = JSON.parse(ticket._assign || "[]");
+						return { _assign: JSON.stringify([...assignees, assignee]) };
+					});
+					frappe.show_alert(`Assigned ${changed.length} tickets`);
+					selected.value = [];
+				});
+		}
+
+		function show_bulk_reply_dialog() {
+			const dialog = frappe.msgprint(
+				`<div class="form-group">
+					<div class="control-input-wrapper mb-4">
+						<div class="control-input">
+							<textarea class="bulk-reply-input form-control" style="min-height: 12rem"></textarea>
+						</div>
+					</div>
+				</div>
+				<div class="flex justify-end">
+					<button type="button" class="btn btn-primary btn-sm bulk-reply-btn">Send</button>
+				</div>`,
+				`Reply to ${selected.value.length} tickets`
+			);
+
+			dialog.$wrapper.find(".bulk-reply-btn").on("click", () => {
+				const text = dialog.$wrapper.find(".bulk-reply-input").val().trim();
+				if (!text) return;
+				const content = text
+					.split("\n")
+					.map((line) => `<p>${frappe.utils.escape_html(line)}</p>`)
+					.join("");
+				utils
+					.bulk_reply(app.session_key, selected.value, { content })
+					.then((result) => {
+						dialog.hide();
+						frappe.show_alert(`Replied to ${result.communications.length} tickets`);
+						selected.value = [];
+					});
+			});
+		}
+
+		const claiming = ref(false);
+		function next_ticket() {
+			claiming.value = true;
+			utils
+				.get_next_ticket(app.session_key)
+				.then((ticket) => {
+					if (!ticket) {
+						frappe.show_alert("No unassigned tickets left");
+						return;
+					}
+					router.push({ name: "ticket", props: { ticket: ticket.name } });
+				})
+				.finally(() => (claiming.value = false));
+		}
+
 		return {
 			agent,
 			tickets,
+			loading_more,
+			load_more,
+			on_scroll,
+			search_results,
+			claiming,
+			next_ticket,
+			selected,
+			agents,
+			statuses: ["Open", "Replied", "Closed"],
+			bulk_set_status,
+			bulk_assign,
+			show_bulk_reply_dialog,
+			dashboard,
 			...toRefs(state.value),
 			logout: () => app.logout(),
 		};
@@ -0,0 +1,51 @@
+# Copyright (c) 2023, developers@frappe.io and contributors
+# For license information, please see license.txt
+
+import hashlib
+import hmac
+
+import frappe
+from frappe.utils.password import get_encryption_key
+
+
+def publish_issue_update(doc, method=None):
+    """Issue `on_update`, tell connected portals that the ticket changed."""
+    publish_ticket_event(doc.name, doc.support_provider, doc.site_name)
+
+
+def publish_communication_update(doc, method=None):
+    """Communication `after_insert`, tell connected portals about a new reply."""
+    if doc.reference_doctype != "Issue" or not doc.reference_name:
+        return
+
+    issue = frappe.db.get_value(
+        "Issue", doc.reference_name, ["support_provider", "site_name"], as_dict=True
+    )
+    if issue:
+        publish_ticket_event(
+            doc.reference_name, issue.support_provider, issue.site_name, reply=doc.name
+        )
+
+
+def publish_ticket_event(issue, support_provider=None, site_name=None, reply=None):
+    # portal users are guests, so each channel gets a room of its own that only
+    # those holding its unguessable name join, see `subscribe` in the portals
+    message = {"issue": issue, "reply": reply}
+    channels = []
+    if support_provider:
+        channels.append(get_channel("provider", support_provider))
+    if site_name:
+        channels.append(get_channel("site", site_name))
+
+    for channel in channels:
+        frappe.publish_realtime(
+            event=f"support:{channel}",
+            message=message,
+            task_id=channel,
+            after_commit=True,
+        )
+
+
+def get_channel(scope, name):
+    key = get_encryption_key().encode()
+    return hmac.new(key, f"{scope}:{name}".encode(), hashlib.sha256).hexdigest()[:32]
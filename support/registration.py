@@ -0,0 +1,119 @@
+# Copyright (c) 2023, developers@frappe.io and contributors
+# For license information, please see license.txt
+
+import hashlib
+
+import frappe
+import requests
+from frappe.utils.password import decrypt, encrypt
+from requests.adapters import HTTPAdapter
+
+# (connect, read) timeouts for calls to a customer's site
+VERIFY_TIMEOUT = (3, 10)
+VERIFY_CACHE_TTL = 5 * 60
+REGISTRATION_STATUS_TTL = 60 * 60
+
+_http_session = None
+
+
+def queue_registration(args):
+    """Verify and register a user in a background job, return the registration id.
+
+    Poll `get_registration_status` with the id for the outcome.
+    """
+    registration_id = frappe.generate_hash(length=16)
+    set_registration_status(registration_id, "Verifying")
+    frappe.enqueue(
+        "support.registration.process_registration",
+        queue="short",
+        enqueue_after_commit=True,
+        registration_id=registration_id,
+        email=args.email,
+        site=args.site,
+        # the password is only needed for the verification, keep it out of redis in clear
+        password=encrypt(args.password or ""),
+    )
+    return registration_id
+
+
+def process_registration(registration_id, email, site, password):
+    from support.www.support.portal import complete_registration
+
+    if not frappe.conf.get("developer_mode") and not verify_credentials(
+        site, email, decrypt(password)
+    ):
+        set_registration_status(
+            registration_id,
+            "Invalid",
+            "The site URL, email or password is incorrect. Please check and try again.",
+        )
+        return
+
+    try:
+        registered = complete_registration(frappe._dict(email=email, site=site))
+    except Exception:
+        set_registration_status(
+            registration_id, "Error", "Something went wrong, please try again later."
+        )
+        raise
+
+    set_registration_status(registration_id, "Registered" if registered else "Pending")
+
+
+def get_registration_status(registration_id):
+    return frappe.cache().get_value(f"support_registration:{registration_id}")
+
+
+def set_registration_status(registration_id, status, message=None):
+    frappe.cache().set_value(
+        f"support_registration:{registration_id}",
+        {"status": status, "message": message},
+        expires_in_sec=REGISTRATION_STATUS_TTL,
+    )
+
+
+def verify_credentials(site, email, password, scheme="https"):
+    """Log in to the customer's site and ping it, True if the credentials work.
+
+    Definite answers are cached for a few minutes, keyed on a hash of all
+    three values. Network errors count as invalid and are not cached.
+    """
+    digest = hashlib.sha256(f"{site}\0{email}\0{password}".encode()).hexdigest()
+    cache_key = f"support_verified_user:{digest}"
+    if (valid := frappe.cache().get_value(cache_key)) is not None:
+        return valid
+
+    url = f"{scheme}://{site}"
+    session = get_http_session()
+    try:
+        login = session.post(
+            f"{url}/api/method/login",
+            data={"usr": email, "pwd": password},
+            timeout=VERIFY_TIMEOUT,
+        )
+        if login.status_code in (401, 403, 404, 417):
+            valid = False
+        else:
+            login.raise_for_status()
+            ping = session.get(f"{url}/api/method/ping", timeout=VERIFY_TIMEOUT)
+            ping.raise_for_status()
+            valid = ping.json().get("message") == "pong"
+    except (requests.RequestException, ValueError):
+        return False
+    finally:
+        # the session is shared between customers, never keep their cookies
+        session.cookies.clear()
+
+    frappe.cache().set_value(cache_key, valid, expires_in_sec=VERIFY_CACHE_TTL)
+    return valid
+
+
+def get_http_session():
+    """One pooled session per worker process, reused across verifications."""
+    global _http_session
+    if _http_session is None:
+        _http_session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16, max_retries=0)
+        _http_session.mount("https://", adapter)
+        _http_session.mount("http://", adapter)
+    return _http_session
@@ -0,0 +1,159 @@
+# Copyright (c) 2023, developers@frappe.io and contributors
+# For license information, please see license.txt
+
+import frappe
+from bs4 import BeautifulSoup
+from frappe.utils.html_utils import sanitize_html
+from support.search import get_text
+
+PREVIEW_LENGTH = 200
+REBUILD_BATCH_SIZE = 500
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".webp")
+
+
+def render_communication(doc, method=None):
+    """Communication `on_update`, store what the portals serve for a reply.
+
+    The portals send `support_html` as the reply's content and
+    `support_preview` as its snippet, so replies are sanitized and cut once
+    here instead of on every read.
+    """
+    if doc.reference_doctype != "Issue" or not doc.reference_name:
+        return
+    if not doc.has_value_changed("content"):
+        return
+
+    values, missing_thumbnails = render_content(doc.content)
+    frappe.db.set_value("Communication", doc.name, values, update_modified=False)
+    doc.update(values)
+    if missing_thumbnails:
+        frappe.enqueue(
+            "support.render.make_thumbnails",
+            communication=doc.name,
+            enqueue_after_commit=True,
+        )
+
+
+def render_content(content, thumbnails=None):
+    """Sanitized HTML, plain text preview and byte size of a reply's content.
+
+    Also returns whether images without a thumbnail were found.
+    """
+    content = content or ""
+    images = get_images(content)
+    if thumbnails is None:
+        thumbnails = get_thumbnails(images)
+
+    values = {
+        "support_html": rewrite_images(sanitize_html(content), thumbnails),
+        "support_preview": get_preview(content),
+        "support_content_size": len(content.encode()),
+    }
+    missing_thumbnails = [
+        url for url in images if url not in thumbnails and is_local_image(url)
+    ]
+    return values, bool(missing_thumbnails)
+
+
+def get_preview(content):
+    if "<" in content:
+        soup = BeautifulSoup(content, "html.parser")
+        # text of scripts and styles is not part of the message
+        for tag in soup.find_all(["script", "style", "head"]):
+            tag.decompose()
+        content = str(soup)
+    text = " ".join(get_text(content).split())
+    if len(text) > PREVIEW_LENGTH:
+        text = text[: PREVIEW_LENGTH - 3].rstrip() + "..."
+    return text
+
+
+def get_images(content):
+    if "<img" not in content:
+        return []
+    soup = BeautifulSoup(content, "html.parser")
+    return list({img["src"] for img in soup.find_all("img", src=True)})
+
+
+def get_thumbnails(images):
+    """file url -> thumbnail url of the images that have one."""
+    if not images:
+        return {}
+    return dict(
+        frappe.get_all(
+            "File",
+            filters={"file_url": ("in", images), "thumbnail_url": ("is", "set")},
+            fields=["file_url", "thumbnail_url"],
+            as_list=True,
+        )
+    )
+
+
+def is_local_image(url):
+    return url.startswith(("/files/", "/private/files/")) and url.lower().endswith(
+        IMAGE_EXTENSIONS
+    )
+
+
+def rewrite_images(content, thumbnails):
+    """Load images lazily, show thumbnails where there are and link them to the full image."""
+    if "<img" not in content:
+        return content
+
+    soup = BeautifulSoup(content, "html.parser")
+    for img in soup.find_all("img", src=True):
+        img["loading"] = "lazy"
+        src = img["src"]
+        if thumbnail := thumbnails.get(src):
+            img["src"] = thumbnail
+            if img.parent.name != "a":
+                img.wrap(soup.new_tag("a", href=src, target="_blank"))
+    return str(soup)
+
+
+def make_thumbnails(communication):
+    """Create the thumbnails a reply's images lack and render the reply again."""
+    content = frappe.db.get_value("Communication", communication, "content")
+    if content is None:
+        return
+
+    images = [url for url in get_images(content) if is_local_image(url)]
+    thumbnails = get_thumbnails(images)
+    for name in frappe.get_all(
+        "File",
+        filters={"file_url": ("in", [url for url in images if url not in thumbnails])},
+        pluck="name",
+    ):
+        file = frappe.get_doc("File", name)
+        try:
+            thumbnails[file.file_url] = file.make_thumbnail()
+        except Exception:
+            # a broken or missing image keeps its original source
+            frappe.log_error(title=f"Support thumbnail of {file.file_url} failed")
+
+    values, _ = render_content(content, thumbnails)
+    frappe.db.set_value("Communication", communication, values, update_modified=False)
+
+
+def rebuild_rendered_replies():
+    """Render every reply on an Issue, with the thumbnails that already exist."""
+    last_name = ""
+    while True:
+        replies = frappe.get_all(
+            "Communication",
+            filters={"reference_doctype": "Issue", "name": (">", last_name)},
+            fields=["name", "content"],
+            order_by="name asc",
+            limit=REBUILD_BATCH_SIZE,
+        )
+        if not replies:
+            break
+
+        for reply in replies:
+            values, _ = render_content(reply.content)
+            frappe.db.set_value(
+                "Communication", reply.name, values, update_modified=False
+            )
+        frappe.db.commit()
+        last_name = replies[-1].name
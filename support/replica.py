@@ -0,0 +1,166 @@
+# Copyright (c) 2023, developers@frappe.io and contributors
+# For license information, please see license.txt
+
+import functools
+import hashlib
+import inspect
+import time
+from contextlib import contextmanager
+
+import frappe
+from frappe.defaults import set_default
+
+# replica lag above which reads stay on the primary, override with `support_replica_max_lag`
+MAX_REPLICA_LAG = 10
+# the lag is measured every minute, reads stay on the primary when it is older
+REPLICA_LAG_TTL = 3 * 60
+# seconds a session reads from the primary after it wrote, override with `support_primary_pin`
+PRIMARY_PIN_WINDOW = 15
+
+REPLICA_LAG_KEY = "support_replica_lag"
+# heartbeat row in tabDefaultValue, written on the primary and read on the replica
+HEARTBEAT_PARENT = "__support_replica"
+HEARTBEAT_KEY = "heartbeat"
+HEARTBEAT_POLL_INTERVAL = 0.5
+
+
+def read_from_replica(fn):
+    """Serve a read only endpoint from the read replica when one is configured.
+
+    Reads stay on the primary when the replica lags, when the session wrote
+    within the last few seconds (see `pin_to_primary`) and when the caller
+    already wrote in this transaction.
+    """
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        kwargs = frappe.get_newargs(fn, kwargs)
+        if not should_use_replica(get_session_key(fn, args, kwargs)):
+            return fn(*args, **kwargs)
+
+        frappe.connect_replica()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            restore_primary()
+
+    return wrapper
+
+
+def pin_to_primary(fn):
+    """Send the session's reads to the primary for a while after this endpoint wrote."""
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        kwargs = frappe.get_newargs(fn, kwargs)
+        result = fn(*args, **kwargs)
+        if session_key := get_session_key(fn, args, kwargs):
+            window = frappe.conf.get("support_primary_pin") or PRIMARY_PIN_WINDOW
+            frappe.cache().set_value(get_pin_key(session_key), 1, expires_in_sec=window)
+        return result
+
+    return wrapper
+
+
+def should_use_replica(session_key=None):
+    if not frappe.conf.get("read_from_replica"):
+        return False
+    # already on the replica, or reads must see this transaction's writes
+    if hasattr(frappe.local, "primary_db") or frappe.db.transaction_writes:
+        return False
+    if session_key and frappe.cache().get_value(get_pin_key(session_key)):
+        return False
+    # no recent measurement is treated as too far behind
+    lag = frappe.cache().get_value(REPLICA_LAG_KEY)
+    return lag is not None and lag <= get_max_replica_lag()
+
+
+def measure_replica_lag():
+    """Scheduled every minute, time how long a heartbeat takes to show on the replica.
+
+    Only reads the site's own tables, so it needs no replication privileges.
+    Endpoints read the cached result and never measure themselves.
+    """
+    if not frappe.conf.get("read_from_replica"):
+        return
+
+    beat = frappe.generate_hash(length=16)
+    set_default(HEARTBEAT_KEY, beat, HEARTBEAT_PARENT)
+    frappe.db.commit()
+    written = time.monotonic()
+
+    lag = None
+    max_lag = get_max_replica_lag()
+    frappe.connect_replica()
+    try:
+        while time.monotonic() - written <= max_lag:
+            if get_heartbeat() == beat:
+                lag = time.monotonic() - written
+                break
+            time.sleep(HEARTBEAT_POLL_INTERVAL)
+    finally:
+        restore_primary()
+
+    if lag is None:
+        # not caught up within the limit, `inf` does not survive json
+        lag = max_lag + 1
+    frappe.cache().set_value(REPLICA_LAG_KEY, lag, expires_in_sec=REPLICA_LAG_TTL)
+
+
+def get_heartbeat():
+    # end the snapshot of the last poll, a new one sees rows replicated since
+    frappe.db.rollback()
+    value = frappe.db.sql(
+        "select defvalue from tabDefaultValue where parent = %s and defkey = %s",
+        (HEARTBEAT_PARENT, HEARTBEAT_KEY),
+    )
+    return value[0][0] if value else None
+
+
+def get_max_replica_lag():
+    return frappe.conf.get("support_replica_max_lag") or MAX_REPLICA_LAG
+
+
+def restore_primary():
+    if hasattr(frappe.local, "primary_db"):
+        frappe.local.db.close()
+        frappe.local.db = frappe.local.primary_db
+        del frappe.local.primary_db
+
+
+@contextmanager
+def on_primary():
+    """Run the block against the primary even inside `read_from_replica`.
+
+    For lookups whose results are cached, a lagging replica must not cache
+    a stale answer.
+    """
+    replica = frappe.local.db
+    frappe.local.db = getattr(frappe.local, "primary_db", replica)
+    try:
+        yield
+    finally:
+        frappe.local.db = replica
+
+
+def get_session_key(fn, args, kwargs):
+    """The session key of a call, passed by name or by position.
+
+    Customer endpoints take `key`, agent endpoints `session_key`.
+    """
+    signature = inspect.signature(fn)
+    try:
+        arguments = signature.bind_partial(*args, **kwargs).arguments
+    except TypeError:
+        return None
+    values = {}
+    for name, value in arguments.items():
+        if signature.parameters[name].kind == inspect.Parameter.VAR_KEYWORD:
+            values.update(value)
+        else:
+            values[name] = value
+    return values.get("session_key") or values.get("key")
+
+
+def get_pin_key(session_key):
+    return f"support_primary_pin:{hashlib.sha256(session_key.encode()).hexdigest()}"
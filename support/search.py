@@ -0,0 +1,181 @@
+# Copyright (c) 2023, developers@frappe.io and contributors
+# For license information, please see license.txt
+
+import html
+import re
+
+import frappe
+from frappe.utils import strip_html_tags
+
+SEARCH_INDEX = "Support Search Index"
+
+
+def search_tickets(text, support_provider=None, site_names=None, limit=20):
+    """Return tickets whose subject, replies or site match `text`, best match first.
+
+    Every word has to match, the last one as a prefix so that results show
+    up while typing. Subject matches rank above matches in replies. Text
+    without a word long enough for the full-text index is matched with LIKE
+    on the subject instead. Tickets of sites whose name contains `text` come
+    last.
+    """
+    text = (text or "").strip()
+    if not text or (site_names is not None and not site_names):
+        return []
+
+    values = {
+        "query": get_search_query(text),
+        "like": f"%{text}%",
+        "support_provider": support_provider,
+        "site_names": tuple(site_names or ()),
+        "limit": limit,
+    }
+    conditions = []
+    if support_provider:
+        conditions.append("idx.support_provider = %(support_provider)s")
+    if site_names:
+        conditions.append("idx.site_name in %(site_names)s")
+
+    if values["query"]:
+        matches = get_matches(
+            """(
+                match(idx.subject) against (%(query)s in boolean mode)
+                or match(idx.content) against (%(query)s in boolean mode)
+            )""",
+            """(
+                match(idx.subject) against (%(query)s in boolean mode) * 2
+                + match(idx.content) against (%(query)s in boolean mode)
+            )""",
+            conditions,
+            values,
+        )
+    else:
+        matches = get_matches("idx.subject like %(like)s", "2", conditions, values)
+
+    # separate queries, so that the full-text index is still used
+    found = {match.name for match in matches}
+    for match in get_matches("idx.site_name like %(like)s", "1", conditions, values):
+        if match.name not in found:
+            matches.append(match)
+    return matches[:limit]
+
+
+def get_matches(match_condition, score, conditions, values):
+    return frappe.db.sql(
+        f"""
+        select
+            issue.name, issue.subject, issue.status, issue.priority,
+            issue.creation, issue.site_name, {score} as score
+        from `tab{SEARCH_INDEX}` idx
+        inner join `tabIssue` issue on issue.name = idx.name
+        where
+            {match_condition}
+            {"".join(f" and {condition}" for condition in conditions)}
+        order by score desc, issue.creation desc
+        limit %(limit)s
+        """,
+        values,
+        as_dict=True,
+    )
+
+
+def get_search_query(text):
+    # shorter words are not in the index (innodb_ft_min_token_size)
+    words = [word for word in re.findall(r"\w+", text or "") if len(word) >= 3]
+    if not words:
+        return ""
+    words[-1] += "*"
+    return " ".join(f"+{word}" for word in words)
+
+
+def update_issue_index(doc, method=None):
+    """Issue `on_update`, keep subject, site and provider of the entry current."""
+    if not frappe.db.exists(SEARCH_INDEX, doc.name):
+        index_issue(doc.name)
+        return
+
+    if any(
+        doc.has_value_changed(field)
+        for field in ("subject", "site_name", "support_provider")
+    ):
+        frappe.db.set_value(
+            SEARCH_INDEX,
+            doc.name,
+            {
+                "subject": doc.subject,
+                "site_name": doc.site_name,
+                "support_provider": doc.support_provider,
+            },
+            update_modified=False,
+        )
+
+
+def delete_issue_index(doc, method=None):
+    frappe.db.delete(SEARCH_INDEX, {"name": doc.name})
+
+
+def update_communication_index(doc, method=None):
+    """Communication `after_insert`, append the reply text to its ticket's entry."""
+    if doc.reference_doctype != "Issue" or not doc.reference_name:
+        return
+
+    if not frappe.db.exists(SEARCH_INDEX, doc.reference_name):
+        index_issue(doc.reference_name)
+        return
+
+    frappe.db.sql(
+        f"""
+        update `tab{SEARCH_INDEX}`
+        set content = concat_ws('\n', content, %s)
+        where name = %s
+        """,
+        (get_text(doc.content), doc.reference_name),
+    )
+
+
+def index_issue(issue_name):
+    """(Re)build the entry of a ticket from the Issue and all of its replies."""
+    issue = frappe.db.get_value(
+        "Issue",
+        issue_name,
+        ["name", "subject", "site_name", "support_provider"],
+        as_dict=True,
+    )
+    if not issue:
+        return
+
+    replies = frappe.get_all(
+        "Communication",
+        filters={"reference_doctype": "Issue", "reference_name": issue_name},
+        pluck="content",
+        order_by="creation asc",
+    )
+    frappe.db.delete(SEARCH_INDEX, {"name": issue_name})
+    frappe.get_doc(
+        {
+            "doctype": SEARCH_INDEX,
+            "issue": issue.name,
+            "subject": issue.subject,
+            "site_name": issue.site_name,
+            "support_provider": issue.support_provider,
+            "content": "\n".join(get_text(content) for content in replies),
+        }
+    ).db_insert()
+
+
+def rebuild_search_index():
+    for issue_name in frappe.get_all("Issue", pluck="name", order_by="creation asc"):
+        index_issue(issue_name)
+
+
+def get_text(content):
+    return html.unescape(strip_html_tags(content or "")).strip()
+
+
+def add_search_indexes():
+    for column in ("subject", "content"):
+        index_name = f"{column}_fulltext_index"
+        if not frappe.db.has_index(f"tab{SEARCH_INDEX}", index_name):
+            frappe.db.sql_ddl(
+                f"alter table `tab{SEARCH_INDEX}` add fulltext index `{index_name}` (`{column}`)"
+            )
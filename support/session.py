@@ -0,0 +1,284 @@
+# Copyright (c) 2023, developers@frappe.io and contributors
+# For license information, please see license.txt
+
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+import frappe
+from frappe.utils import add_to_date, get_datetime, now_datetime, time_diff_in_seconds
+from frappe.utils.password import get_encryption_key
+from support.replica import on_primary
+
+# seconds a resolved session, agent or customer lookup stays in redis
+SESSION_CACHE_TTL = 10 * 60
+
+# default lifetime of a session key, override with `support_session_lifetime` in site config
+SESSION_LIFETIME = 7 * 24 * 60 * 60
+
+# redis set of revoked token ids, rebuilt from Support Session when it expires
+REVOKED_TOKENS_KEY = "support_revoked_session_tokens"
+REVOKED_TOKENS_TTL = 24 * 60 * 60
+
+# token ids this worker has already seen revoked, revocation is permanent
+_revoked_token_ids = set()
+
+
+def get_session(key):
+    """Resolve a session key to the email, agent context and customer flag behind it.
+
+    Expired keys resolve to None. All lookups are cached, call
+    `clear_session_cache` when the underlying rows change.
+    """
+    if not key:
+        return None
+
+    if is_session_token(key):
+        return get_token_session(key)
+
+    session = frappe.cache().get_value(f"support_session:{key}")
+    if session is None:
+        with on_primary():
+            session = (
+                frappe.db.get_value(
+                    "Support Session",
+                    {"key": key, "revoked": 0},
+                    ["email", "expires_on"],
+                    as_dict=True,
+                )
+                or ""
+            )
+        set_session_cache(key, session)
+
+    if not session or is_expired(session.expires_on):
+        return None
+
+    remaining = time_diff_in_seconds(session.expires_on, now_datetime())
+    if remaining < get_session_lifetime() / 2:
+        session = renew_session(key, session)
+
+    return frappe._dict(
+        key=key,
+        email=session.email,
+        expires_on=session.expires_on,
+        agent=get_agent_context(session.email),
+        is_customer=is_customer(session.email),
+    )
+
+
+def get_token_session(token):
+    payload = verify_session_token(token)
+    if not payload:
+        return None
+
+    is_agent = payload.role == "agent"
+    return frappe._dict(
+        key=token,
+        email=payload.email,
+        expires_on=add_to_date(now_datetime(), seconds=payload.exp - time.time()),
+        agent=get_agent_context(payload.email) if is_agent else None,
+        is_customer=not is_agent and is_customer(payload.email),
+    )
+
+
+def signed_sessions_enabled():
+    return bool(frappe.conf.get("support_signed_session_keys"))
+
+
+def is_session_token(key):
+    # random keys are hex, tokens are `<payload>.<signature>`
+    return signed_sessions_enabled() and "." in key
+
+
+def make_session_token(email, for_agent=False):
+    """Return a signed key that carries its own email, role and expiry.
+
+    These keys are verified without touching the database, Support Session
+    only records the ones that were revoked before they expired.
+    """
+    payload = {
+        "sid": frappe.generate_hash(length=16),
+        "email": email,
+        "role": "agent" if for_agent else "customer",
+        "exp": int(time.time() + get_session_lifetime()),
+    }
+    body = _b64encode(json.dumps(payload, separators=(",", ":")).encode())
+    return f"{body}.{_sign(body)}"
+
+
+def verify_session_token(token):
+    body, _, signature = token.partition(".")
+    if not hmac.compare_digest(_sign(body), signature):
+        return None
+
+    try:
+        payload = frappe._dict(json.loads(_b64decode(body)))
+    except ValueError:
+        return None
+
+    if payload.exp <= time.time() or is_token_revoked(payload.sid):
+        return None
+    return payload
+
+
+def revoke_session_token(token):
+    payload = verify_session_token(token)
+    if not payload:
+        return
+
+    session_doc = frappe.new_doc("Support Session")
+    session_doc.email = payload.email
+    session_doc.key = payload.sid
+    session_doc.revoked = 1
+    session_doc.issued_on = now_datetime()
+    # keep the row until the token would have expired anyway
+    session_doc.expires_on = add_to_date(
+        now_datetime(), seconds=payload.exp - time.time()
+    )
+    session_doc.insert(ignore_permissions=True)
+
+    _revoked_token_ids.add(payload.sid)
+    load_revoked_tokens()
+    frappe.cache().sadd(REVOKED_TOKENS_KEY, payload.sid)
+
+
+def is_token_revoked(sid):
+    if sid in _revoked_token_ids:
+        return True
+    load_revoked_tokens()
+    if frappe.cache().sismember(REVOKED_TOKENS_KEY, sid):
+        _revoked_token_ids.add(sid)
+        return True
+    return False
+
+
+def load_revoked_tokens():
+    cache = frappe.cache()
+    if cache.exists(REVOKED_TOKENS_KEY):
+        return
+
+    sids = frappe.get_all(
+        "Support Session",
+        filters={"revoked": 1, "expires_on": (">", now_datetime())},
+        pluck="key",
+    )
+    # the empty member keeps the set alive when nothing is revoked
+    cache.sadd(REVOKED_TOKENS_KEY, "", *sids)
+    cache.expire(cache.make_key(REVOKED_TOKENS_KEY), REVOKED_TOKENS_TTL)
+
+
+def _sign(body):
+    secret = frappe.conf.get("support_session_secret") or get_encryption_key()
+    digest = hmac.new(secret.encode(), body.encode(), hashlib.sha256).digest()
+    return _b64encode(digest)
+
+
+def _b64encode(value):
+    return base64.urlsafe_b64encode(value).decode().rstrip("=")
+
+
+def _b64decode(value):
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+
+def get_session_lifetime():
+    return frappe.conf.get("support_session_lifetime") or SESSION_LIFETIME
+
+
+def get_session_expiry():
+    return add_to_date(now_datetime(), seconds=get_session_lifetime())
+
+
+def is_expired(expires_on):
+    return not expires_on or get_datetime(expires_on) <= now_datetime()
+
+
+def renew_session(key, session):
+    """Slide the expiry forward, at most once per half lifetime of the key."""
+    session.expires_on = get_session_expiry()
+    # sessions are also resolved by endpoints that read from the replica
+    with on_primary():
+        frappe.db.set_value(
+            "Support Session",
+            {"key": key},
+            "expires_on",
+            session.expires_on,
+            update_modified=False,
+        )
+    set_session_cache(key, session)
+    return session
+
+
+def set_session_cache(key, session):
+    expires_in_sec = SESSION_CACHE_TTL
+    if session and session.expires_on:
+        remaining = time_diff_in_seconds(session.expires_on, now_datetime())
+        expires_in_sec = max(1, min(expires_in_sec, int(remaining)))
+    frappe.cache().set_value(
+        f"support_session:{key}", session, expires_in_sec=expires_in_sec
+    )
+
+
+def get_agent_context(email):
+    agent = _get_cached(f"support_agent:{email}", lambda: fetch_agent(email) or {})
+    # copy so that callers can annotate the context without touching the cache
+    return frappe._dict(agent) if agent else None
+
+
+def is_customer(email):
+    return bool(
+        _get_cached(
+            f"support_customer:{email}",
+            lambda: frappe.db.exists("Supported Site User", {"email": email}) or "",
+        )
+    )
+
+
+def fetch_agent(email):
+    SupportProvider = frappe.qb.DocType("Support Provider")
+    SupportProviderTeam = frappe.qb.DocType("Support Provider Team")
+    SupportTeamMember = frappe.qb.DocType("Support Team Member")
+    User = frappe.qb.DocType("User")
+
+    agent = (
+        frappe.qb.from_(SupportProvider)
+        .inner_join(SupportProviderTeam)
+        .on(SupportProvider.name == SupportProviderTeam.support_provider)
+        .inner_join(SupportTeamMember)
+        .on(SupportProviderTeam.name == SupportTeamMember.parent)
+        .inner_join(User)
+        .on(SupportTeamMember.user == User.name)
+        .select(
+            SupportProvider.name.as_("support_provider"),
+            SupportProviderTeam.name.as_("team"),
+            SupportProviderTeam.team_name.as_("team_name"),
+            SupportTeamMember.user.as_("email"),
+            SupportTeamMember.disabled,
+            User.full_name,
+        )
+        .where(SupportTeamMember.user == email)
+        .run(as_dict=True)
+    )
+    return agent[0] if agent else None
+
+
+def clear_session_cache(key=None, emails=None):
+    keys = []
+    if key:
+        keys.append(f"support_session:{key}")
+    for email in set(emails or []):
+        keys.append(f"support_agent:{email}")
+        keys.append(f"support_customer:{email}")
+    if keys:
+        frappe.cache().delete_value(keys)
+
+
+def _get_cached(cache_key, generator):
+    value = frappe.cache().get_value(cache_key)
+    if value is None:
+        with on_primary():
+            value = generator()
+        frappe.cache().set_value(cache_key, value, expires_in_sec=SESSION_CACHE_TTL)
+    return value
@@ -0,0 +1,262 @@
+# Copyright (c) 2023, developers@frappe.io and contributors
+# For license information, please see license.txt
+
+import json
+import time
+
+import frappe
+from frappe.desk.form.assign_to import add as add_assign
+from frappe.desk.form.assign_to import remove as remove_assign
+from frappe.utils import add_to_date, escape_html, get_datetime, get_url, now_datetime
+from support.assignment import get_assignee
+from support.outbox import queue_mail_batch
+from support.utils import admin_session
+
+SLA_BATCH_SIZE = 200
+# a run reads at most SLA_BATCH_SIZE * SLA_MAX_BATCHES tickets per provider and deadline
+SLA_MAX_BATCHES = 50
+
+# stored as a global default, so it survives a redis flush
+SLA_LAST_RUN_KEY = "support_sla_last_run"
+SLA_LOCK = "support_sla_check"
+SLA_RUNS_KEY = "support_sla_runs"
+SLA_RUNS_KEPT = 100
+
+# deadline field -> statuses in which the deadline still applies
+SLA_DEADLINES = {
+    "response_by": ("Open",),
+    "resolution_by": ("Open", "Replied"),
+}
+
+
+def check_sla():
+    """Escalate tickets whose response or resolution deadline is near or has passed.
+
+    Every run looks at the deadlines that fell due since the previous run, so a
+    ticket is warned and escalated once per deadline and nothing is rescanned.
+    """
+    lock = f"{frappe.conf.db_name}:{SLA_LOCK}"
+    # a named lock is released with the connection, also when the worker dies
+    if not frappe.db.sql("select get_lock(%s, 0)", lock)[0][0]:
+        frappe.logger("support").info("SLA check skipped, the last run is still going")
+        return
+    try:
+        run_sla_check()
+        # the next run must see this run's watermark
+        frappe.db.commit()
+    finally:
+        frappe.db.sql("select release_lock(%s)", lock)
+
+
+def run_sla_check():
+    from support.dashboard import count_overdue
+
+    started = time.monotonic()
+    now = now_datetime()
+    since = get_last_run() or add_to_date(now, days=-1)
+
+    stats = frappe._dict(providers=0, scanned=0, warned=0, breached=0)
+    providers = frappe.get_all(
+        "Support Provider",
+        filters={"disabled": 0},
+        fields=[
+            "name",
+            "sla_warning_minutes",
+            "sla_escalation_email",
+            "sla_escalation_priority",
+            "sla_reassign",
+        ],
+    )
+    for provider in providers:
+        warnings, breaches = [], []
+        for deadline in SLA_DEADLINES:
+            if provider.sla_warning_minutes:
+                warn = dict(minutes=provider.sla_warning_minutes)
+                # deadlines up to now are breaches of this run, not warnings
+                warnings += get_due_tickets(
+                    provider.name,
+                    deadline,
+                    max(add_to_date(since, **warn), now),
+                    add_to_date(now, **warn),
+                )
+            breaches += get_due_tickets(provider.name, deadline, since, now)
+
+        stats.providers += 1
+        stats.scanned += len(warnings) + len(breaches)
+        stats.warned += len(warnings)
+        stats.breached += len(breaches)
+        if warnings or breaches:
+            escalate(provider, warnings, breaches)
+            count_overdue(
+                provider.name,
+                [ticket for ticket in breaches if ticket.deadline == "resolution_by"],
+            )
+
+    # committed together with the escalations and counters of this run
+    frappe.db.set_global(SLA_LAST_RUN_KEY, str(now))
+    stats.started_on = str(now)
+    stats.duration = round(time.monotonic() - started, 3)
+    record_run(stats)
+
+
+def get_last_run():
+    """Deadlines up to this time have been handled by `check_sla`."""
+    if last_run := frappe.db.get_global(SLA_LAST_RUN_KEY):
+        return get_datetime(last_run)
+
+
+def get_due_tickets(support_provider, deadline, start, end):
+    """Tickets of the provider with `deadline` in (start, end], read in keyset batches.
+
+    Served by the (support_provider, status, <deadline>) indexes on Issue.
+    """
+    Issue = frappe.qb.DocType("Issue")
+    query = (
+        frappe.qb.from_(Issue)
+        .select(
+            Issue.name,
+            Issue.subject,
+            Issue.priority,
+            Issue.site_name,
+            Issue._assign,
+            Issue[deadline].as_("due_on"),
+        )
+        .where(
+            (Issue.support_provider == support_provider)
+            & Issue.status.isin(SLA_DEADLINES[deadline])
+            & (Issue[deadline] > start)
+            & (Issue[deadline] <= end)
+        )
+        .orderby(Issue[deadline])
+        .orderby(Issue.name)
+        .limit(SLA_BATCH_SIZE)
+    )
+    if deadline == "response_by":
+        query = query.where(Issue.first_responded_on.isnull())
+
+    tickets = []
+    last = None
+    for _ in range(SLA_MAX_BATCHES):
+        batch_query = query
+        if last:
+            batch_query = query.where(
+                (Issue[deadline] > last.due_on)
+                | ((Issue[deadline] == last.due_on) & (Issue.name > last.name))
+            )
+        batch = batch_query.run(as_dict=True)
+        for ticket in batch:
+            ticket.deadline = deadline
+        tickets += batch
+        if len(batch) < SLA_BATCH_SIZE:
+            return tickets
+        last = batch[-1]
+
+    frappe.logger("support").warning(
+        f"SLA check of {support_provider} stopped at {len(tickets)} tickets on {deadline}"
+    )
+    return tickets
+
+
+def escalate(provider, warnings, breaches):
+    """Bump priority and reassign breached tickets, then mail everyone involved once."""
+    for ticket in warnings + breaches:
+        ticket.assignees = frappe.parse_json(ticket._assign or "[]")
+
+    for ticket in breaches:
+        if (
+            provider.sla_escalation_priority
+            and ticket.priority != provider.sla_escalation_priority
+        ):
+            bump_priority(ticket.name, provider.sla_escalation_priority)
+        if provider.sla_reassign:
+            reassign(ticket, provider.name)
+
+    # recipient -> [(level, ticket)], one digest per recipient
+    digests = {}
+    for level, tickets in (("Breached", breaches), ("Approaching", warnings)):
+        for ticket in tickets:
+            recipients = set(ticket.assignees)
+            if provider.sla_escalation_email:
+                recipients.add(provider.sla_escalation_email)
+            for recipient in recipients:
+                digests.setdefault(recipient, []).append(
+                    {
+                        "level": level,
+                        "name": ticket.name,
+                        "subject": ticket.subject,
+                        "deadline": ticket.deadline,
+                        "due_on": str(ticket.due_on),
+                    }
+                )
+
+    if digests:
+        queue_mail_batch(
+            "support.sla.send_sla_digest",
+            [
+                {
+                    "recipient": recipient,
+                    "support_provider": provider.name,
+                    "tickets": tickets,
+                }
+                for recipient, tickets in digests.items()
+            ],
+        )
+
+
+def bump_priority(issue_name, priority):
+    from support.dashboard import ISSUE_FIELDS, move_counters
+
+    before = frappe.db.get_value("Issue", issue_name, ISSUE_FIELDS, as_dict=True)
+    frappe.db.set_value("Issue", issue_name, "priority", priority)
+    move_counters(before, frappe._dict(before, priority=priority))
+
+
+def reassign(ticket, support_provider):
+    assignee = get_assignee(support_provider, exclude=ticket.assignees)
+    if not assignee:
+        return
+
+    with admin_session():
+        for user in ticket.assignees:
+            remove_assign("Issue", ticket.name, user)
+        add_assign(
+            {
+                "assign_to": [assignee],
+                "doctype": "Issue",
+                "name": ticket.name,
+                "description": ticket.subject,
+            }
+        )
+    ticket.assignees = [assignee]
+
+
+def send_sla_digest(recipient, support_provider, tickets):
+    link = get_url("/support/portal/agent")
+    rows = "".join(
+        f"<li><b>{ticket['level']}</b>: {ticket['name']} - {escape_html(ticket['subject'])}"
+        f" ({ticket['deadline'].replace('_by', '')} due {ticket['due_on']})</li>"
+        for ticket in tickets
+    )
+    frappe.sendmail(
+        recipients=[recipient],
+        subject=f"Frappe Support: {len(tickets)} tickets need attention",
+        message=f"""<p>These {support_provider} tickets are close to or past their SLA.</p>
+        <ul>{rows}</ul>
+        <p><a href="{link}">Open the agent portal</a></p>
+        """,
+        now=True,
+    )
+
+
+def record_run(stats):
+    frappe.logger("support").info(f"SLA check: {json.dumps(stats)}")
+    cache = frappe.cache()
+    cache.lpush(SLA_RUNS_KEY, json.dumps(stats))
+    cache.ltrim(SLA_RUNS_KEY, 0, SLA_RUNS_KEPT - 1)
+
+
+@frappe.whitelist()
+def get_sla_runs():
+    """Timings of the last SLA checks, newest first."""
+    frappe.only_for("System Manager")
+    return [json.loads(run) for run in frappe.cache().lrange(SLA_RUNS_KEY, 0, -1)]
@@ -17,13 +17,7 @@ $(".btn-register").on("click", () => {
     (r) => {
       if (!r.valid) {
         frappe.call("support.www.support.portal.register_user", args, (r) => {
-          $(".register").addClass("hidden");
-          $(".register-complete").removeClass("hidden");
-          const key = localStorage.getItem("support-key");
-          key &&
-            frappe.call("support.www.support.portal.delete_session_key", {
-              key,
-            });
+          wait_for_registration(r.message.registration_id);
         });
       } else {
         frappe.toast({
@@ -35,3 +29,35 @@ $(".btn-register").on("click", () => {
     }
   );
 });
+
+// the user is verified against their site in the background, poll for the outcome
+function wait_for_registration(registration_id) {
+  frappe.call(
+    "support.www.support.portal.get_registration_status",
+    { registration_id },
+    (r) => {
+      const registration = r.message || { status: "Verifying" };
+      if (registration.status == "Verifying") {
+        setTimeout(() => wait_for_registration(registration_id), 2000);
+        return;
+      }
+      if (["Invalid", "Error"].includes(registration.status)) {
+        frappe.msgprint(registration.message, "Registration Failed");
+        $(".btn-register").prop("disabled", false);
+        return;
+      }
+      if (registration.status == "Registered") {
+        $(".register-complete .alert").html(
+          "A verification email has been sent to your email address. Please click on the link in the email to start your support session."
+        );
+      }
+      $(".register").addClass("hidden");
+      $(".register-complete").removeClass("hidden");
+      const key = localStorage.getItem("support-key");
+      key &&
+        frappe.call("support.www.support.portal.delete_session_key", {
+          key,
+        });
+    }
+  );
+}
@@ -33,11 +33,80 @@ function load_ticket() {
       update_html(r.message);
       set_sla(r.message);
       set_replies(r.message);
+      set_replies_cursor(r.message.replies_cursor);
     }
   );
 }
+
+// older replies come as snippets, their bodies are fetched when opened
+let replies_cursor = null;
+function set_replies_cursor(cursor) {
+  replies_cursor = cursor;
+  $(".btn-older-replies").toggleClass("hidden", !cursor);
+}
+$(".btn-older-replies").on("click", () => {
+  frappe.call(
+    "support.www.support.portal.get_thread_replies",
+    { key: key, issue: issue_name, cursor: replies_cursor, snippets: 1 },
+    (r) => {
+      set_replies(r.message);
+      set_replies_cursor(r.message.next_cursor);
+    }
+  );
+});
+$(".replies").on("click", ".reply-snippet", (e) => {
+  const $reply = $(e.currentTarget).closest(".reply");
+  frappe.call(
+    "support.www.support.portal.get_reply",
+    { key: key, issue: issue_name, reply: $reply.attr("data-name") },
+    (r) => $reply.find(".reply-card").html(r.message.content)
+  );
+});
 validate_session().then(() => load_ticket());
 
+// poll for replies added to this ticket since the last check
+let watermark = null;
+function sync_ticket() {
+  return frappe
+    .call("support.www.support.portal.get_changes", {
+      key: key,
+      since: watermark,
+      issue: issue_name,
+    })
+    .then((r) => {
+      const changes = r.message;
+      watermark = changes.watermark;
+      changes.channels && subscribe(changes.channels);
+      // a burst of changes comes in pages, fetch the rest right away
+      if (changes.has_more) sync_ticket();
+      if (changes.not_modified) return;
+      for (let row of changes.deleted) {
+        $(`.reply[data-name='${row.name}']`).remove();
+      }
+      const new_replies = changes.replies.filter(
+        (reply) => !$(`.reply[data-name='${reply.name}']`).length
+      );
+      set_replies({ replies: new_replies }, true);
+    });
+}
+sync_ticket();
+setInterval(sync_ticket, frappe.realtime ? 5 * 60 * 1000 : 30 * 1000);
+
+function subscribe(channels) {
+  if (!frappe.realtime) return;
+  const debounced_sync = frappe.utils.debounce(sync_ticket, 500);
+  for (let channel of channels) {
+    frappe.realtime.on(`support:${channel}`, (message) => {
+      message.issue == issue_name && debounced_sync();
+    });
+  }
+  // each channel is a room of its own, join again after reconnecting
+  const join = () =>
+    channels.forEach((channel) => frappe.realtime.publish("task_subscribe", channel));
+  join();
+  frappe.realtime.on("connect", join);
+}
+
 function update_html(issue) {
   $(".issue-name").html(issue.name);
   $(".subject").html(issue.subject);
@@ -47,24 +116,40 @@ function update_html(issue) {
   $(".indicator-pill").addClass(issue.indicator);
   issue.state == "Closed" && $(".issue-body").addClass("hidden");
 }
-function set_replies(issue) {
-  for (let r of issue.replies) {
+function set_replies(issue, prepend = false) {
+  // replies are newest first, prepend them oldest first to keep that order
+  const replies = prepend ? [...issue.replies].reverse() : issue.replies;
+  for (let r of replies) {
     let creation = moment(r.creation).fromNow();
     let bg_color = "bg-gray-100";
     if (r.sent_or_received == "Sent") {
       r.sender_full_name = "Support Agent";
       bg_color = "bg-blue-50";
     }
-    $(`<div class='reply py-3'>
+    const $reply = $(`<div class='reply py-3' data-name='${r.name}'>
 				<div class='py-2' style='font-weight: 800;'>${r.sender_full_name}</div>
 				<span class='pull-right text-muted small' style="margin-top: -1.8rem" title="${r.creation}">
 					${creation}
 				</span>
-				<div class='reply-card p-3 rounded ${bg_color}'>${r.content}</div>
-			</div>`).appendTo(".replies");
+				<div class='reply-card p-3 rounded ${bg_color}'>${
+          r.content !== undefined
+            ? r.content
+            : `<div class='reply-snippet' style='cursor: pointer'>${frappe.utils.escape_html(r.snippet)}
+                <div class='text-muted small'>Show full message${
+                  r.support_content_size ? ` (${format_size(r.support_content_size)})` : ""
+                }</div></div>`
+        }</div>
+			</div>`);
+    prepend ? $reply.prependTo(".replies") : $reply.appendTo(".replies");
   }
 }
 
+function format_size(bytes) {
+  if (bytes < 1024) return `${bytes} B`;
+  if (bytes < 1024 * 1024) return `${(bytes / 1024).toFixed(1)} KB`;
+  return `${(bytes / 1024 / 1024).toFixed(1)} MB`;
+}
+
 function set_sla(issue) {
   if (!issue.resolution_by || ["Closed", "Resolved"].includes(issue.status)) {
     return;
@@ -92,14 +177,19 @@ let get_args = (validate = true) => {
   return args;
 };
 
+// kept until the reply is posted, so a retried post is not posted twice
+let reply_key = null;
 $(".btn-reply").on("click", () => {
   let args = get_args();
   if (args) {
+    reply_key = reply_key || frappe.utils.get_random(16);
+    args.idempotency_key = reply_key;
     frappe.call("support.www.support.portal.reply", args, (data) => {
-      // refresh replies
+      reply_key = null;
       tinymce.get('reply_content').setContent('');
-      $(".replies").empty();
-      set_replies({ replies: data.message });
+      const reply = data.message;
+      !$(`.reply[data-name='${reply.name}']`).length &&
+        set_replies({ replies: [reply] }, true);
     });
   }
 });
@@ -1,4 +1,6 @@
 let args = {};
+let next_cursor = null;
+let loading_more = false;
 args.key = localStorage.getItem("support-key");
 
 if (args.key == null) {
@@ -13,6 +15,73 @@ args.open_or_close = open_or_close || "";
 
 if (args.key) {
   get_issues(args);
+  watch_changes();
+}
+
+// merge changed tickets into the list, on realtime events or polling
+function watch_changes() {
+  let watermark = null;
+  const sync = () =>
+    frappe
+      .call("support.www.support.portal.get_changes", {
+        key: args.key,
+        since: watermark,
+      })
+      .then((r) => {
+        const changes = r.message;
+        watermark = changes.watermark;
+        changes.channels && subscribe(changes.channels, sync);
+        if (changes.not_modified) return;
+        apply_changes(changes);
+        // a burst of changes comes in pages, fetch the rest right away
+        if (changes.has_more) return sync();
+      });
+  sync();
+  setInterval(sync, frappe.realtime ? 5 * 60 * 1000 : 30 * 1000);
+}
+
+function apply_changes(changes) {
+  for (let row of changes.deleted) {
+    $(`.issue-row[data-name='${row.name}']`).remove();
+  }
+  for (let issue of changes.issues) {
+    const $existing = $(`.issue-row[data-name='${issue.name}']`);
+    if (!matches_filter(issue)) {
+      $existing.remove();
+    } else if ($existing.length) {
+      $existing.replaceWith(render_issue(issue));
+    } else if (!args.search_text && is_newest(issue)) {
+      // older tickets show up when their page is loaded
+      $(".issues .empty-state").remove();
+      render_issue(issue).prependTo($(".issues"));
+    }
+  }
+}
+
+function is_newest(issue) {
+  const newest = $(".issue-row").first().attr("data-creation");
+  return !newest || moment(issue.creation).isSameOrAfter(moment(newest));
+}
+
+function matches_filter(issue) {
+  if (args.open_or_close == "Open" || !args.open_or_close) {
+    return issue.status != "Closed";
+  }
+  if (args.open_or_close == "Close") return issue.status == "Closed";
+  return true;
+}
+
+function subscribe(channels, sync) {
+  if (!frappe.realtime) return;
+  const debounced_sync = frappe.utils.debounce(sync, 500);
+  for (let channel of channels) {
+    frappe.realtime.on(`support:${channel}`, debounced_sync);
+  }
+  // each channel is a room of its own, join again after reconnecting
+  const join = () =>
+    channels.forEach((channel) => frappe.realtime.publish("task_subscribe", channel));
+  join();
+  frappe.realtime.on("connect", join);
 }
 
 $(".input-search").change(function () {
@@ -21,6 +90,15 @@ $(".input-search").change(function () {
   args.open_or_close = open_or_close;
 });
 
+// load the next page when the list is scrolled to its end
+$(window).on("scroll", () => {
+  const near_bottom =
+    $(window).scrollTop() + $(window).height() >= $(document).height() - 200;
+  if (!near_bottom || loading_more || !next_cursor) return;
+  loading_more = true;
+  get_issues({ ...args, cursor: next_cursor });
+});
+
 $(".link-logout").on("click", () => {
   localStorage.removeItem("support-key");
   frappe.call("support.www.support.portal.delete_session_key", { key: args.key })
@@ -35,6 +113,7 @@ $(".link-logout").on("click", () => {
 
 function get_issues(args) {
   frappe.call("support.www.support.portal.get_issues", args, (r) => {
+    loading_more = false;
     if (r.message.error == "Invalid Session") {
       frappe.toast("Invalid Session");
       window.location.href = "/support/portal/customer";
@@ -48,52 +127,51 @@ function get_issues(args) {
       );
     }
 
-    $(".issues").empty();
+    next_cursor = r.message.next_cursor;
+    !args.cursor && $(".issues").empty();
     r.message.email && $(".user-email").html(r.message.email);
-    if (!r.message.issues.length) {
-      return $(`<div class="section-padding text-center">
+    if (!args.cursor && !r.message.issues.length) {
+      return $(`<div class="section-padding text-center empty-state">
                 <img src="/assets/frappe/images/ui-states/list-empty-state.svg" 
                     alt="Generic Empty State" class="null-state" 
                     style="height: 60px; display: block; margin: auto;">
                 <div class='pt-4'>No Open issues found</div>
             </div>`).appendTo($(".issues"));
     }
-    for (let i of r.message.issues) {
-      i.status =
-        i.status == "Closed"
-          ? "Closed"
-          : ["Awaiting Reply", "Replied"].includes(i.status)
-          ? "Awaiting Reply"
-          : "Open";
-      i.indicator =
-        i.status == "Open"
-          ? "red"
-          : i.status == "Awaiting Reply"
-          ? "yellow"
-          : "green";
-      $(`<div class='border-bottom'>
-                  <div class='d-flex justify-content-between p-3'>
-                      <div>
-                          <a href="/support/portal/customer/issue/${i.name}">
-                              <div class="h6">${i.subject}</div>
-                          </a>
-                          <span class="text-muted">${i.name}</span> &#149;
-                          <span class='text-muted' title="${i.creation}">
-                              ${moment(i.creation).fromNow()}
-                          </span>
-                      </div>
-                      <div class='d-flex flex-column align-items-end'>
-                          <span class='indicator-pill pull-right ${
-                            i.indicator
-                          }'>
-                              <span>${i.status}</span>
-                          </span>
-                          <span class='text-muted mt-1'>
-                              ${i.site_name}
-                          </span>
-                      </div>
-                  </div>
-              </div>`).appendTo($(".issues"));
+    for (let issue of r.message.issues) {
+      render_issue(issue).appendTo($(".issues"));
     }
   });
 }
+
+function render_issue(i) {
+  const status =
+    i.status == "Closed"
+      ? "Closed"
+      : ["Awaiting Reply", "Replied"].includes(i.status)
+      ? "Awaiting Reply"
+      : "Open";
+  const indicator =
+    status == "Open" ? "red" : status == "Awaiting Reply" ? "yellow" : "green";
+  return $(`<div class='border-bottom issue-row' data-name='${i.name}' data-creation='${i.creation}'>
+                <div class='d-flex justify-content-between p-3'>
+                    <div>
+                        <a href="/support/portal/customer/issue/${i.name}">
+                            <div class="h6">${i.subject}</div>
+                        </a>
+                        <span class="text-muted">${i.name}</span> &#149;
+                        <span class='text-muted' title="${i.creation}">
+                            ${moment(i.creation).fromNow()}
+                        </span>
+                    </div>
+                    <div class='d-flex flex-column align-items-end'>
+                        <span class='indicator-pill pull-right ${indicator}'>
+                            <span>${status}</span>
+                        </span>
+                        <span class='text-muted mt-1'>
+                            ${i.site_name}
+                        </span>
+                    </div>
+                </div>
+            </div>`);
+}
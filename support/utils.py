@@ -0,0 +1,93 @@
+# Copyright (c) 2023, developers@frappe.io and contributors
+# For license information, please see license.txt
+
+from contextlib import contextmanager
+
+import frappe
+from frappe.query_builder.functions import Max
+from frappe.utils import now
+
+
+@contextmanager
+def admin_session():
+    """Run the block as Administrator with permission checks off.
+
+    Unlike `frappe.set_user` this does not reset the session data, role and
+    permission caches or form_dict, it only swaps the user and restores it
+    even when the block raises.
+    """
+    session = frappe.local.session
+    user, ignore_permissions = session.user, frappe.flags.ignore_permissions
+    session.user = "Administrator"
+    frappe.flags.ignore_permissions = True
+    try:
+        yield
+    finally:
+        session.user = user
+        frappe.flags.ignore_permissions = ignore_permissions
+
+
+def insert_child_row(parenttype, parent, parentfield, values):
+    """Append one row to a child table without loading and saving the parent.
+
+    Only the new row is written and the parent's `modified` is bumped. The
+    parent's validations and hooks do not run, callers have to clear whatever
+    the parent's `on_update` would have cleared.
+    """
+    child_doctype = frappe.get_meta(parenttype).get_field(parentfield).options
+
+    # lock the parent so that concurrent appends get distinct idx values
+    frappe.db.get_value(parenttype, parent, "name", for_update=True)
+
+    Child = frappe.qb.DocType(child_doctype)
+    last_idx = (
+        frappe.qb.from_(Child)
+        .select(Max(Child.idx))
+        .where(
+            (Child.parent == parent)
+            & (Child.parenttype == parenttype)
+            & (Child.parentfield == parentfield)
+        )
+        .run()[0][0]
+    )
+
+    # `new_doc` applies the field defaults, `db_insert` alone would not
+    row = frappe.new_doc(child_doctype)
+    row.update(
+        {
+            "parent": parent,
+            "parenttype": parenttype,
+            "parentfield": parentfield,
+            "idx": (last_idx or 0) + 1,
+            **values,
+        }
+    )
+    row.db_insert()
+
+    touch(parenttype, parent)
+    return row
+
+
+def delete_child_rows(parenttype, parent, parentfield, filters):
+    """Delete the rows of a child table matching `filters`, counterpart of `insert_child_row`."""
+    child_doctype = frappe.get_meta(parenttype).get_field(parentfield).options
+    frappe.db.delete(
+        child_doctype,
+        {
+            "parent": parent,
+            "parenttype": parenttype,
+            "parentfield": parentfield,
+            **filters,
+        },
+    )
+    touch(parenttype, parent)
+
+
+def touch(doctype, name):
+    frappe.db.set_value(
+        doctype,
+        name,
+        {"modified": now(), "modified_by": frappe.session.user},
+        update_modified=False,
+    )
+    frappe.clear_document_cache(doctype, name)
@@ -0,0 +1,150 @@
+# Copyright (c) 2023, developers@frappe.io and contributors
+# For license information, please see license.txt
+
+import functools
+
+import frappe
+import redis
+from frappe.desk.form.assign_to import add as add_assign
+from frappe.utils import add_to_date, get_datetime
+from support.utils import admin_session
+
+# how much earlier than its deadline a ticket is served per priority step
+PRIORITY_STEP = 4 * 60 * 60
+PRIORITY_RANKS = {"Low": 0, "Medium": 1, "High": 2, "Urgent": 3}
+
+# tickets without an SLA are served as if they were due this long after creation
+DEFAULT_DUE_IN = 24 * 60 * 60
+
+# the queue is rebuilt from the database when this marker expires
+QUEUE_TTL = 24 * 60 * 60
+
+QUEUE_FIELDS = [
+    "name",
+    "subject",
+    "status",
+    "support_provider",
+    "priority",
+    "response_by",
+    "resolution_by",
+    "first_responded_on",
+    "creation",
+    "_assign",
+]
+
+
+def get_queue_key(support_provider):
+    # RedisWrapper does not prefix sorted set commands, they are called on the
+    # plain client with the prefixed key
+    return frappe.cache().make_key(f"support_work_queue:{support_provider}")
+
+
+def get_score(issue):
+    """Lower is served first: the SLA deadline, pulled forward by priority."""
+    if not issue.first_responded_on and issue.response_by:
+        due_on = get_datetime(issue.response_by)
+    elif issue.resolution_by:
+        due_on = get_datetime(issue.resolution_by)
+    else:
+        due_on = add_to_date(get_datetime(issue.creation), seconds=DEFAULT_DUE_IN)
+    return due_on.timestamp() - PRIORITY_RANKS.get(issue.priority, 0) * PRIORITY_STEP
+
+
+def is_queued(issue):
+    return (
+        issue.status == "Open"
+        and issue.support_provider
+        and not frappe.parse_json(issue._assign or "[]")
+    )
+
+
+def update_work_queue(doc, method):
+    if method == "on_trash":
+        if doc.support_provider:
+            key = get_queue_key(doc.support_provider)
+            frappe.db.after_commit.add(
+                functools.partial(redis.Redis.zrem, frappe.cache(), key, doc.name)
+            )
+        return
+    sync_ticket(doc.name)
+
+
+def update_work_queue_from_todo(doc, method):
+    if doc.reference_type == "Issue" and doc.reference_name:
+        sync_ticket(doc.reference_name)
+
+
+def sync_ticket(issue_name):
+    """Queue or drop the ticket once the transaction commits."""
+    frappe.db.after_commit.add(functools.partial(update_queue_entry, issue_name))
+
+
+def update_queue_entry(issue_name):
+    # read after the commit, _assign is written straight to the database and
+    # the document can be stale
+    issue = frappe.db.get_value("Issue", issue_name, QUEUE_FIELDS, as_dict=True)
+    if not issue or not issue.support_provider:
+        return
+
+    cache = frappe.cache()
+    key = get_queue_key(issue.support_provider)
+    if is_queued(issue):
+        redis.Redis.zadd(cache, key, {issue.name: get_score(issue)})
+    else:
+        redis.Redis.zrem(cache, key, issue.name)
+
+
+def load_queue(support_provider):
+    cache = frappe.cache()
+    if cache.get_value(f"support_work_queue_loaded:{support_provider}"):
+        return
+
+    issues = frappe.get_all(
+        "Issue",
+        filters={"support_provider": support_provider, "status": "Open"},
+        fields=QUEUE_FIELDS,
+    )
+    key = get_queue_key(support_provider)
+    pipeline = cache.pipeline()
+    pipeline.delete(key)
+    scores = {issue.name: get_score(issue) for issue in issues if is_queued(issue)}
+    if scores:
+        pipeline.zadd(key, scores)
+    pipeline.execute()
+    cache.set_value(
+        f"support_work_queue_loaded:{support_provider}", 1, expires_in_sec=QUEUE_TTL
+    )
+
+
+def claim_next_ticket(support_provider, agent_email):
+    """Pop the most urgent unassigned ticket of the provider and assign it to the agent.
+
+    ZPOPMIN hands every ticket to one caller only, entries that went stale
+    since they were queued are dropped on the way. A claim that is rolled
+    back puts its ticket back.
+    """
+    load_queue(support_provider)
+    cache = frappe.cache()
+    key = get_queue_key(support_provider)
+    while popped := redis.Redis.zpopmin(cache, key):
+        issue_name, score = frappe.safe_decode(popped[0][0]), popped[0][1]
+        issue = frappe.db.get_value("Issue", issue_name, QUEUE_FIELDS, as_dict=True)
+        if not issue or not is_queued(issue):
+            continue
+        if issue.support_provider != support_provider:
+            continue
+
+        # the pop is not undone by a rollback of the assignment, queue it again
+        frappe.db.after_rollback.add(
+            functools.partial(redis.Redis.zadd, cache, key, {issue_name: score})
+        )
+        with admin_session():
+            add_assign(
+                {
+                    "assign_to": [agent_email],
+                    "doctype": "Issue",
+                    "name": issue_name,
+                    "description": issue.subject,
+                }
+            )
+        return issue_name
@@ -1,18 +1,78 @@
 # Copyright (c) 2022, Frappe Technologies Pvt. Ltd. and Contributors
 # GNU GPLv3 License. See license.txt
 
+import base64
+import functools
+import hashlib
+import json
+
 import frappe
-from frappe.frappeclient import FrappeClient
+import redis
+from frappe.utils import cint, get_datetime, now_datetime
 from frappe.utils.data import get_url
-
-
-def get_or_create_session_key(email):
-    session_key = frappe.db.get_value("Support Session", {"email": email}, "key")
-    if not session_key:
+from support import outbox, registration
+from support.outbox import queue_mail, queue_sla_ack
+from support.realtime import get_channel
+from support.replica import pin_to_primary, read_from_replica
+from support.search import search_tickets
+from support.session import (
+    clear_session_cache,
+    get_session,
+    get_session_expiry,
+    is_session_token,
+    make_session_token,
+    revoke_session_token,
+    signed_sessions_enabled,
+)
+from support.utils import admin_session, insert_child_row
+
+DEFAULT_PAGE_LENGTH = 20
+MAX_PAGE_LENGTH = 100
+MAX_SEARCH_RESULTS = 500
+
+# replies sent with a ticket, older ones are loaded a page at a time
+THREAD_PAGE_LENGTH = 10
+
+REPLY_FIELDS = [
+    "name",
+    "sender",
+    "recipients",
+    "sender_full_name",
+    "seen",
+    "subject",
+    "creation",
+    "sent_or_received",
+    "modified",
+    "support_content_size",
+]
+
+# a post in flight holds its idempotency key at most this long
+REPLY_PENDING_TTL = 60
+
+CHANGE_STREAMS = ("issues", "replies", "deleted", "assignments")
+
+
+def get_or_create_session_key(email, for_agent=False):
+    if signed_sessions_enabled():
+        return make_session_token(email, for_agent=for_agent)
+
+    session_key = frappe.db.get_value(
+        "Support Session",
+        {"email": email, "revoked": 0, "expires_on": (">", now_datetime())},
+        "key",
+    )
+    if session_key:
+        frappe.db.set_value(
+            "Support Session", {"key": session_key}, "expires_on", get_session_expiry()
+        )
+        clear_session_cache(key=session_key)
+    else:
         session_key = frappe.utils.generate_hash()
         session_doc = frappe.new_doc("Support Session")
         session_doc.email = email
         session_doc.key = session_key
+        session_doc.issued_on = now_datetime()
+        session_doc.expires_on = get_session_expiry()
         session_doc.insert(ignore_permissions=True)
     return session_key
 
@@ -32,33 +92,65 @@ def send_session_key_email(email, session_key, for_agent=False):
         )
 
 
+def send_login_link_email(email, for_agent=False):
+    session_key = get_or_create_session_key(email, for_agent=for_agent)
+    send_session_key_email(email, session_key, for_agent=for_agent)
+
+
+def queue_login_link(email, for_agent=False):
+    """Send a login link in the background, repeated requests within a minute share one mail.
+
+    In developer mode the job only creates the session key, see `send_session_key_email`.
+    """
+    return queue_mail(
+        "support.www.support.portal.send_login_link_email",
+        dedupe_key=f"login_link:{int(for_agent)}:{email}",
+        email=email,
+        for_agent=for_agent,
+    )
+
+
 @frappe.whitelist(allow_guest=True)
 def send_session_key(email):
     support_user_exists = frappe.db.exists("Supported Site User", {"email": email})
     if not support_user_exists:
         return False
-    session_key = get_or_create_session_key(email)
-    send_session_key_email(email, session_key)
+    queue_login_link(email)
     return True
 
 
+@frappe.whitelist(allow_guest=True)
+def get_mail_status(mail_id):
+    return outbox.get_mail_status(mail_id)
+
+
 @frappe.whitelist(allow_guest=True)
 def validate_session_key(key, for_agent=False):
-    session_user_email = frappe.db.get_value("Support Session", {"key": key}, "email")
-    if not session_user_email:
+    session = get_session(key)
+    if not session:
         return False
     if for_agent:
-        return frappe.db.get_value(
-            "Support Team Member", {"user": session_user_email}, "user"
-        )
-    return frappe.db.get_value(
-        "Supported Site User", {"email": session_user_email}, "email"
-    )
+        return session.agent and session.email
+    return session.is_customer and session.email
 
 
 @frappe.whitelist(allow_guest=True)
 def delete_session_key(key):
+    if is_session_token(key):
+        revoke_session_token(key)
+        return
     frappe.db.delete("Support Session", {"key": key})
+    clear_session_cache(key=key)
+
+
+def canonicalize_site_name(site):
+    """Reduce a site url to the bare host name sites and issues are stored by.
+
+    `https://Example.frappe.cloud/app/` -> `example.frappe.cloud`
+    """
+    site = (site or "").strip().lower()
+    site = site.replace("https://", "").replace("http://", "")
+    return site.split("/")[0]
 
 
 @frappe.whitelist(allow_guest=True)
@@ -78,84 +170,73 @@ def validate_user(email, site):
 
 @frappe.whitelist(allow_guest=True)
 def register_user(**kwargs):
+    """Start verifying the user against their site, poll `get_registration_status`."""
     args = frappe._dict(kwargs)
-    # remove https:// or http:// from site url and last slash
-    args.site = (args.site).replace("https://", "").replace("http://", "").rstrip("/")
-    if not frappe.conf.get("developer_mode"):
-        check_if_valid_user(args)
+    args.site = canonicalize_site_name(args.site)
+    return {"registration_id": registration.queue_registration(args)}
 
+
+@frappe.whitelist(allow_guest=True)
+def get_registration_status(registration_id):
+    return registration.get_registration_status(registration_id)
+
+
+def complete_registration(args):
+    """Add a verified user to their site, or raise a ticket to get the site added.
+
+    Returns True when the user was added and mailed a login link.
+    """
     try:
         site_exists = frappe.db.exists("Supported Site", args.site)
         if site_exists:
             registered = auto_register_user(args)
             if registered:
-                return
-
-        frappe.session.user = "Administrator"
-
-        issue = frappe.new_doc("Issue")
-        issue.subject = "Partner Support Portal User Registration - " + args.email
-        issue.source = "Partner Support Portal"
-        issue.insert(ignore_permissions=True)
-
-        content = f"""
-        <p>You have a new registration from {args.email}<p>
-        <p>Site URL: {args.site}</p>
-        <p>
-        </p>"""
-
-        communication = frappe.get_doc(
-            dict(
-                doctype="Communication",
-                communication_type="Communication",
-                communication_medium="Email",
-                reference_doctype="Issue",
-                reference_name=issue.name,
-                sent_or_received="Received",
-                sender=args.email,
-                content=content,
-                subject=issue.subject,
+                return True
+
+        with admin_session():
+            issue = frappe.new_doc("Issue")
+            issue.subject = f"Partner Support Portal User Registration - {args.email}"
+            issue.source = "Partner Support Portal"
+            issue.insert(ignore_permissions=True)
+
+            content = f"""
+            <p>You have a new registration from {args.email}<p>
+            <p>Site URL: {args.site}</p>
+            <p>
+            </p>"""
+
+            communication = frappe.get_doc(
+                dict(
+                    doctype="Communication",
+                    communication_type="Communication",
+                    communication_medium="Email",
+                    reference_doctype="Issue",
+                    reference_name=issue.name,
+                    sent_or_received="Received",
+                    sender=args.email,
+                    content=content,
+                    subject=issue.subject,
+                )
             )
-        )
-        communication.insert(ignore_permissions=True)
+            communication.insert(ignore_permissions=True)
+        return False
     except Exception:
         frappe.log_error()
         raise
-    finally:
-        frappe.session.user = "Guest"
-
-
-def check_if_valid_user(args):
-    url = f"https://{args.site}"
-    try:
-        client = FrappeClient(url, args.email, args.password)
-        client.get_api("ping")
-    except BaseException:
-        frappe.throw(
-            "The site URL, email or password is incorrect. Please check and try again.",
-            title="Invalid Credentials",
-        )
 
 
 def auto_register_user(args):
-    site = frappe.get_doc("Supported Site", args.site)
-    site.append("support_users", {"email": args.email, "disabled": 0})
-    site.save(ignore_permissions=True)
-    key_sent = send_session_key(args.email)
-    if not key_sent:
-        return False
-    frappe.msgprint(
-        """A verification email has been sent to your email address.
-        Please click on the link in the email to start your support session.""",
-        title="Verification Email Sent",
+    insert_child_row(
+        "Supported Site", args.site, "support_users", {"email": args.email, "disabled": 0}
     )
-    return True
+    clear_session_cache(emails=[args.email])
+    return send_session_key(args.email)
 
 
 @frappe.whitelist(allow_guest=True)
+@read_from_replica
 def get_issues(**kwargs):
     args = frappe._dict(kwargs)
-    print(args)
     email = get_user_email(args.key)
     site_list = get_site_list(email)
 
@@ -174,15 +255,14 @@ def get_issues(**kwargs):
 
         issue_condition = Issue.subject.isnotnull()
         if search_text:
-            issue_condition = Issue.subject.like(
-                f"%{search_text}%"
-            ) | Issue.site_name.like(f"%{search_text}%")
-
-        site_name_condition = []
-        for d in site_list:
-            site_name_condition.append(Issue.site_name.like(f"%{d}%"))
+            matches = search_tickets(
+                search_text, site_names=site_list, limit=MAX_SEARCH_RESULTS
+            )
+            issue_condition = Issue.name.isin(
+                [match.name for match in matches] or [""]
+            )
 
-        issues = (
+        query = (
             frappe.qb.from_(Issue)
             .select(
                 Issue.name,
@@ -196,22 +276,71 @@ def get_issues(**kwargs):
                     [
                         issue_condition,
                         status_condition,
-                        frappe.qb.terms.Criterion.any(site_name_condition),
+                        Issue.site_name.isin(site_list),
                     ]
                 )
             )
-            .orderby(Issue.creation, order=frappe.qb.desc)
-            .run(as_dict=True)
         )
+        issues, next_cursor = paginate(query, Issue, args.cursor, args.page_length)
 
     return {
         "email": email,
         "issues": issues,
+        "next_cursor": next_cursor,
     }
 
 
+def paginate(query, table, cursor=None, page_length=None):
+    """Run `query` one page at a time, newest first, keyed on (creation, name).
+
+    Returns the rows and the cursor to pass back for the next page, None on
+    the last page. Selected rows must include `creation` and `name`.
+    """
+    page_length = min(cint(page_length) or DEFAULT_PAGE_LENGTH, MAX_PAGE_LENGTH)
+    if cursor:
+        creation, name = decode_cursor(cursor)
+        query = query.where(
+            (table.creation < creation)
+            | ((table.creation == creation) & (table.name < name))
+        )
+
+    rows = (
+        query.orderby(table.creation, order=frappe.qb.desc)
+        .orderby(table.name, order=frappe.qb.desc)
+        .limit(page_length + 1)
+        .run(as_dict=True)
+    )
+    if len(rows) <= page_length:
+        return rows, None
+
+    rows = rows[:page_length]
+    return rows, encode_cursor(rows[-1])
+
+
+def encode_cursor(row):
+    value = frappe.as_json([str(row.creation), row.name], indent=None)
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        creation, name = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return get_datetime(creation), name
+    except (TypeError, ValueError):
+        frappe.throw("Invalid cursor, please reload the page.")
+
+
+@frappe.whitelist(allow_guest=True)
+@read_from_replica
+def search_issues(key, query):
+    email = get_user_email(key)
+    site_list = get_site_list(email)
+    return search_tickets(query, site_names=site_list)
+
+
 def get_user_email(session_key):
-    email = frappe.db.get_value("Support Session", {"key": session_key}, "email")
+    session = get_session(session_key)
+    email = session and session.email
     if not email:
         frappe.throw(
             "Your support session has expired. Please login again to continue with Frappe Support.",
@@ -222,7 +351,13 @@ def get_user_email(session_key):
 
 def get_site_list(email):
     site_list = frappe.get_all(
-        "Supported Site", {"email": email, "disabled": 0}, pluck="site_name"
+        "Supported Site",
+        filters=[
+            ["Supported Site User", "email", "=", email],
+            ["Supported Site User", "disabled", "=", 0],
+        ],
+        pluck="site_name",
+        distinct=True,
     )
     if not site_list:
         frappe.throw(
@@ -233,6 +368,7 @@ def get_site_list(email):
 
 
 @frappe.whitelist(allow_guest=True)
+@read_from_replica
 def get_site_options(key):
     email = get_user_email(key)
     site_list = get_site_list(email)
@@ -240,10 +376,10 @@ def get_site_options(key):
 
 
 @frappe.whitelist(allow_guest=True)
+@read_from_replica
 def get_ticket(**kwargs):
     args = frappe._dict(kwargs)
-    email = get_user_email(args.key)
-    site_list = get_site_list(email)
+    check_ticket_access(args.key, args.issue)
 
     Issue = frappe.qb.DocType("Issue")
     issue = (
@@ -256,15 +392,9 @@ def get_ticket(**kwargs):
             Issue.raised_by,
             Issue.site_name,
         )
-        .where((Issue.name == args.issue))  # add site_name condition
+        .where(Issue.name == args.issue)
         .run(as_dict=True)
-    )
-    if not issue:
-        frappe.throw(
-            "You do not have access to this ticket. Please contact your system administrator.",
-            title="No Access",
-        )
-    issue = issue[0]
+    )[0]
 
     if issue.status in ("Replied", "Awaiting Reply"):
         issue.indicator = "yellow"
@@ -276,14 +406,51 @@ def get_ticket(**kwargs):
         issue.indicator = "green"
         issue.status = "Closed"
 
-    issue.replies = get_replies(args.issue)
+    issue.replies, issue.replies_cursor = get_thread(
+        args.issue, page_length=args.page_length
+    )
+    format_replies(issue.replies)
     return issue
 
 
 @frappe.whitelist(allow_guest=True)
+@read_from_replica
+def get_thread_replies(key, issue, cursor=None, page_length=None, snippets=0):
+    """Older replies on the ticket, pass the `replies_cursor` of `get_ticket` and
+    then the `next_cursor` of each page.
+
+    With `snippets` the replies carry a plain text `snippet` instead of their
+    `content`, fetch a body with `get_reply`.
+    """
+    check_ticket_access(key, issue)
+    replies, next_cursor = get_thread(issue, cursor, page_length, cint(snippets))
+    return {"replies": format_replies(replies), "next_cursor": next_cursor}
+
+
+@frappe.whitelist(allow_guest=True)
+@read_from_replica
+def get_reply(key, issue, reply):
+    check_ticket_access(key, issue)
+    replies = get_replies(issue, name=reply)
+    if not replies:
+        frappe.throw("This reply does not exist.", frappe.DoesNotExistError)
+    return replies[0]
+
+
+def check_ticket_access(key, issue):
+    site_list = get_site_list(get_user_email(key))
+    if frappe.db.get_value("Issue", issue, "site_name") not in site_list:
+        frappe.throw(
+            "You do not have access to this ticket. Please contact your system administrator.",
+            title="No Access",
+        )
+
+
+@frappe.whitelist(allow_guest=True)
+@pin_to_primary
 def create_issue(**kwargs):
     args = frappe._dict(kwargs)
-    site_name = (args.sitename).replace("https://", "").split("/")[0]
+    site_name = canonicalize_site_name(args.sitename)
 
     email = get_user_email(args.key)
     site_list = get_site_list(email)
@@ -322,7 +489,7 @@ def create_issue(**kwargs):
     communication.insert(ignore_permissions=True)
 
     if not frappe.conf.developer_mode:
-        email_sla_info(issue)
+        queue_sla_ack(issue.name)
     return issue.name
 
 
@@ -353,49 +520,107 @@ def email_sla_info(issue):
 
 
 @frappe.whitelist(allow_guest=True)
+@pin_to_primary
 def reply(**kwargs):
+    """Post a reply and return it, pass the same `idempotency_key` when retrying a post."""
     args = frappe._dict(kwargs)
     email = get_user_email(args.key)
-    site_list = get_site_list(email)
+    check_ticket_access(args.key, args.issue)
 
-    content = frappe.parse_json(args.reply).get("content")
-    old_user = frappe.session.user
-    frappe.set_user("Administrator")
-    communication = frappe.get_doc(
-        dict(
-            doctype="Communication",
-            communication_type="Communication",
-            communication_medium="Email",
-            reference_doctype="Issue",
-            reference_name=args.issue,
-            sent_or_received="Received",
-            sender=email,
-            content=content,
-            subject=args.subject,
+    def create(reply_key):
+        content = frappe.parse_json(args.reply).get("content")
+        communication = frappe.get_doc(
+            dict(
+                doctype="Communication",
+                communication_type="Communication",
+                communication_medium="Email",
+                reference_doctype="Issue",
+                reference_name=args.issue,
+                sent_or_received="Received",
+                sender=email,
+                content=content,
+                subject=args.subject,
+                support_idempotency_key=reply_key,
+            )
         )
-    )
-    communication.insert(ignore_permissions=True)
-    frappe.set_user(old_user)
+        with admin_session():
+            communication.insert(ignore_permissions=True)
+        return communication
+
+    posted = post_reply(args.key, args.idempotency_key, args.issue, create)
+    return format_replies([posted])[0]
+
+
+def post_reply(session_key, idempotency_key, issue, create):
+    """Insert a reply with `create(reply_key)` and return it like `get_reply_rows` does.
+
+    The reply is read from the document `create` returns. The `reply_key`
+    passed to `create` goes into the reply's unique `support_idempotency_key`
+    in the same transaction, so the reply and its key commit together and a
+    post with the key of an earlier one returns that reply instead.
+    """
+    if not idempotency_key:
+        return make_reply_row(create(None))
+
+    reply_key = get_reply_key(session_key, idempotency_key)
+    if replies := get_reply_rows(issue, idempotency_key=reply_key):
+        return replies[0]
+
+    # a retry must not race the post it retries, which is not committed yet
+    cache = frappe.cache()
+    pending_key = cache.make_key(f"support_reply_pending:{reply_key}")
+    # RedisWrapper has no set-if-absent, it is called on the plain client
+    if not redis.Redis.set(cache, pending_key, 1, nx=True, ex=REPLY_PENDING_TTL):
+        frappe.throw("This reply is still being posted, please wait a moment.")
+    release = functools.partial(redis.Redis.delete, cache, pending_key)
+    frappe.db.after_commit.add(release)
+    frappe.db.after_rollback.add(release)
+
+    try:
+        communication = create(reply_key)
+    except Exception as e:
+        # the key is inserted with the reply or set on it right after
+        if not (
+            isinstance(e, frappe.DuplicateEntryError)
+            or frappe.db.is_unique_key_violation(e)
+        ):
+            raise
+        frappe.throw("This reply was posted already, please reload the ticket.")
+    return make_reply_row(communication)
+
+
+def get_reply_key(session_key, idempotency_key):
+    value = f"{session_key}:{idempotency_key}"
+    return hashlib.sha256(value.encode()).hexdigest()
+
+
+def make_reply_row(communication):
+    row = frappe._dict({field: communication.get(field) for field in REPLY_FIELDS})
+    # set by support.render when the reply was inserted
+    row.content = communication.get("support_html")
+    return row
 
-    return get_replies(args.issue)
 
+def get_replies(issue, name=None):
+    return format_replies(get_reply_rows(issue, name))
 
-def get_replies(issue):
-    replies = frappe.get_all(
+
+def get_reply_rows(issue, name=None, idempotency_key=None):
+    filters = {"reference_doctype": "Issue", "reference_name": issue}
+    if name:
+        filters["name"] = name
+    if idempotency_key:
+        filters["support_idempotency_key"] = idempotency_key
+
+    return frappe.get_all(
         "Communication",
-        fields=[
-            "sender",
-            "recipients",
-            "sender_full_name",
-            "content",
-            "seen",
-            "subject",
-            "creation",
-            "sent_or_received",
-        ],
-        filters={"reference_doctype": "Issue", "reference_name": issue},
+        fields=REPLY_FIELDS + ["support_html as content"],
+        filters=filters,
         order_by="creation desc",
     )
+
+
+def format_replies(replies):
     for c in replies:
         if c.sent_or_received == "Sent":
             c.sender_full_name = "Support Agent"
@@ -405,7 +630,177 @@ def get_replies(issue):
     return replies
 
 
+def get_thread(issue, cursor=None, page_length=None, snippets=False):
+    """A page of the replies on `issue`, newest first, and the cursor of the next page.
+
+    `snippets` swaps the content for the plain text preview stored by
+    `support.render`, so a long thread can be listed without its bodies.
+    """
+    Communication = frappe.qb.DocType("Communication")
+    query = get_replies_query(issue, snippets)
+    return paginate(query, Communication, cursor, page_length or THREAD_PAGE_LENGTH)
+
+
+def get_replies_query(issue, snippets=False):
+    Communication = frappe.qb.DocType("Communication")
+    if snippets:
+        content = Communication.support_preview.as_("snippet")
+    else:
+        content = Communication.support_html.as_("content")
+
+    return (
+        frappe.qb.from_(Communication)
+        .select(*[Communication[field] for field in REPLY_FIELDS], content)
+        .where(
+            (Communication.reference_doctype == "Issue")
+            & (Communication.reference_name == issue)
+        )
+    )
+
+
+@frappe.whitelist(allow_guest=True)
+def get_changes(key, since=None, issue=None):
+    """Return the customer's tickets, and replies on `issue`, changed after `since`.
+
+    Call without `since` to get the first watermark and the realtime channels
+    to listen on, then poll with the watermark of each response. Nothing
+    changed is `not_modified`, call again right away while `has_more` is set.
+    """
+    email = get_user_email(key)
+    site_list = get_site_list(email)
+    if not since:
+        return {
+            "watermark": encode_watermark(get_start_positions()),
+            "channels": [get_channel("site", site) for site in site_list],
+        }
+
+    positions = decode_watermark(since)
+    Issue = frappe.qb.DocType("Issue")
+    issues, has_more = fetch_changes(
+        frappe.qb.from_(Issue)
+        .select(
+            Issue.name,
+            Issue.status,
+            Issue.subject,
+            Issue.creation,
+            Issue.site_name,
+            Issue.modified,
+        )
+        .where(Issue.site_name.isin(site_list)),
+        Issue,
+        positions,
+        "issues",
+    )
+
+    replies = []
+    if issue and frappe.db.get_value("Issue", issue, "site_name") in site_list:
+        replies, more_replies = fetch_replies(issue, positions)
+        format_replies(replies)
+        has_more |= more_replies
+
+    deleted, more_deleted = get_deleted_since(
+        positions, lambda data: data.get("site_name") in site_list, issue
+    )
+    return make_changes(positions, issues, replies, deleted, has_more or more_deleted)
+
+
+def get_start_positions():
+    start = str(now_datetime())
+    return {stream: [start, ""] for stream in CHANGE_STREAMS}
+
+
+def encode_watermark(positions):
+    value = frappe.as_json(positions, indent=None)
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_watermark(since):
+    """(modified, name) up to which each change stream was sent."""
+    try:
+        positions = json.loads(base64.urlsafe_b64decode(since.encode()))
+        return {stream: positions[stream] for stream in CHANGE_STREAMS}
+    except (TypeError, ValueError, KeyError):
+        frappe.throw("Invalid watermark, please reload the page.")
+
+
+def fetch_changes(query, table, positions, stream, field="modified"):
+    """Rows of `query` after the position of `stream`, keyed on (`field`, name).
+
+    Moves the position to the last row and returns the rows and whether more
+    remain. Selected rows must include `field` and `name`.
+    """
+    modified, name = positions[stream]
+    modified = get_datetime(modified)
+    column = table[field]
+    rows = (
+        query.where((column > modified) | ((column == modified) & (table.name > name)))
+        .orderby(column)
+        .orderby(table.name)
+        .limit(MAX_PAGE_LENGTH + 1)
+        .run(as_dict=True)
+    )
+    has_more = len(rows) > MAX_PAGE_LENGTH
+    rows = rows[:MAX_PAGE_LENGTH]
+    if rows:
+        positions[stream] = [str(rows[-1][field]), rows[-1].name]
+    return rows, has_more
+
+
+def fetch_replies(issue, positions):
+    Communication = frappe.qb.DocType("Communication")
+    return fetch_changes(get_replies_query(issue), Communication, positions, "replies")
+
+
+def get_deleted_since(positions, in_scope, issue=None):
+    """Tombstones of tickets for which `in_scope(data)` holds and of replies on `issue`."""
+    DeletedDocument = frappe.qb.DocType("Deleted Document")
+    deleted, has_more = fetch_changes(
+        frappe.qb.from_(DeletedDocument)
+        .select(
+            DeletedDocument.name,
+            DeletedDocument.deleted_doctype,
+            DeletedDocument.deleted_name,
+            DeletedDocument.data,
+            DeletedDocument.creation,
+        )
+        .where(DeletedDocument.deleted_doctype.isin(("Issue", "Communication"))),
+        DeletedDocument,
+        positions,
+        "deleted",
+        field="creation",
+    )
+
+    tombstones = []
+    for row in deleted:
+        data = frappe.parse_json(row.data)
+        if row.deleted_doctype == "Issue":
+            keep = in_scope(data)
+        else:
+            keep = issue and data.get("reference_name") == issue
+        if keep:
+            tombstones.append(
+                frappe._dict(
+                    doctype=row.deleted_doctype,
+                    name=row.deleted_name,
+                    modified=row.creation,
+                )
+            )
+    return tombstones, has_more
+
+
+def make_changes(positions, issues, replies, deleted, has_more=False):
+    return {
+        "watermark": encode_watermark(positions),
+        "not_modified": not (issues or replies or deleted),
+        "has_more": has_more,
+        "issues": issues,
+        "replies": replies,
+        "deleted": deleted,
+    }
+
+
 @frappe.whitelist(allow_guest=True)
+@pin_to_primary
 def close_issue(**kwargs):
     args = frappe._dict(kwargs)
     email = get_user_email(args.key)
@@ -427,12 +822,3 @@ def close_issue(**kwargs):
 
     if args.content:
         issue.add_comment(text=args.content, comment_email=email)
-
-
-class admin_session:
-    def __enter__(self):
-        self.old_user = frappe.session.user
-        frappe.set_user("Administrator")
-
-    def __exit__(self, exc_type, exc_value, traceback):
-        frappe.set_user(self.old_user)
@@ -1,21 +1,56 @@
 # Copyright (c) 2022, Frappe Technologies Pvt. Ltd. and Contributors
 # GNU GPLv3 License. See license.txt
 
+import csv
+import io
+
 import frappe
 from frappe.core.doctype.communication.email import make as create_communication
 from frappe.desk.form.assign_to import add as add_assign
 from frappe.desk.form.assign_to import remove as remove_assign
 from frappe.query_builder.functions import Count
+from frappe.utils import (
+    cint,
+    escape_html,
+    get_url,
+    validate_email_address,
+)
+from support import outbox
+from support.assignment import is_assigned
+from support.dashboard import get_summary
+from support.frappe_support.doctype.support_provider_team.support_provider_team import (
+    add_member,
+    update_rule_users,
+)
+from support.outbox import queue_mail
+from support.realtime import get_channel
+from support.replica import pin_to_primary, read_from_replica
+from support.search import search_tickets
+from support.session import clear_session_cache, get_agent_context, get_session
+from support.utils import admin_session
+from support.work_queue import claim_next_ticket
 from support.www.support.portal import (
-    admin_session,
+    MAX_PAGE_LENGTH,
+    canonicalize_site_name,
+    decode_watermark,
     delete_session_key,
-    get_or_create_session_key,
-    send_session_key_email,
-    validate_session_key,
+    encode_watermark,
+    fetch_changes,
+    fetch_replies,
+    get_deleted_since,
+    get_reply_rows,
+    get_start_positions,
+    get_thread,
+    make_changes,
+    paginate,
+    post_reply,
+    queue_login_link,
 )
 
 no_cache = 1
 
+MAX_IMPORT_ROWS = 5000
+
 
 def get_context(context):
     pass
@@ -30,31 +65,19 @@ def send_login_link(email):
             title="Not Registered",
         )
 
-    session_key = get_or_create_session_key(email)
-    send_session_key_email(email, session_key, for_agent=True)
+    return queue_login_link(email, for_agent=True)
 
 
 @frappe.whitelist(allow_guest=True)
+@read_from_replica
 def get_agents(session_key):
-    email = validate_session_key(session_key, for_agent=True)
-    if not email:
-        frappe.throw("Invalid Session Key")
+    agent = get_session_agent(session_key)
 
     SupportProvider = frappe.qb.DocType("Support Provider")
     SupportProviderTeam = frappe.qb.DocType("Support Provider Team")
     SupportTeamMember = frappe.qb.DocType("Support Team Member")
     User = frappe.qb.DocType("User")
 
-    support_provider_team = (
-        frappe.qb.from_(SupportProvider)
-        .inner_join(SupportProviderTeam)
-        .on(SupportProvider.name == SupportProviderTeam.support_provider)
-        .inner_join(SupportTeamMember)
-        .on(SupportProviderTeam.name == SupportTeamMember.parent)
-        .where(SupportTeamMember.user == email)
-        .select(SupportProviderTeam.name.as_("team"))
-        .run(as_dict=True)
-    )
     agents = (
         frappe.qb.from_(SupportProvider)
         .inner_join(SupportProviderTeam)
@@ -63,7 +86,7 @@ def get_agents(session_key):
         .on(SupportProviderTeam.name == SupportTeamMember.parent)
         .inner_join(User)
         .on(SupportTeamMember.user == User.name)
-        .where(SupportProviderTeam.name == support_provider_team[0].team)
+        .where(SupportProviderTeam.name == agent.team)
         .select(
             SupportProvider.name.as_("support_provider"),
             SupportProviderTeam.team_name.as_("team"),
@@ -77,68 +100,130 @@ def get_agents(session_key):
 
 
 @frappe.whitelist(allow_guest=True)
-def get_agent(session_key, agent_email=None, with_tickets=True):
-    email = validate_session_key(session_key, for_agent=True)
-    if not email:
-        frappe.throw("Invalid Session Key")
-
-    SupportProvider = frappe.qb.DocType("Support Provider")
-    SupportProviderTeam = frappe.qb.DocType("Support Provider Team")
-    SupportTeamMember = frappe.qb.DocType("Support Team Member")
-    User = frappe.qb.DocType("User")
-
-    agent = (
-        frappe.qb.from_(SupportProvider)
-        .inner_join(SupportProviderTeam)
-        .on(SupportProvider.name == SupportProviderTeam.support_provider)
-        .inner_join(SupportTeamMember)
-        .on(SupportProviderTeam.name == SupportTeamMember.parent)
-        .inner_join(User)
-        .on(SupportTeamMember.user == User.name)
-        .select(
-            SupportProvider.name.as_("support_provider"),
-            SupportProviderTeam.name.as_("team"),
-            SupportProviderTeam.team_name.as_("team_name"),
-            SupportTeamMember.user.as_("email"),
-            SupportTeamMember.disabled,
-            User.full_name,
-        )
-        .where(SupportTeamMember.user == (agent_email or email))
-        .run(as_dict=True)
-    )
+@read_from_replica
+def get_agent(
+    session_key, agent_email=None, with_tickets=False, cursor=None, page_length=None
+):
+    agent = get_session_agent(session_key)
+    if agent_email and agent_email != agent.email:
+        agent = get_agent_context(agent_email)
     if not agent:
         frappe.throw(
             "You have not been registered as an agent. Reach out to your administrator to get registered.",
             title="Not Registered",
         )
 
-    agent = agent[0]
-
-    if not with_tickets:
+    if not cint(with_tickets):
         return agent
 
-    agent.tickets = frappe.get_all(
-        "Issue",
-        fields=[
-            "name",
-            "subject",
-            "status",
-            "priority",
-            "modified",
-            "creation",
-            "site_name",
-            "_assign",
-            "_comments",
-        ],
-        filters={"support_provider": agent.support_provider},
-        order_by="creation desc",
+    agent.tickets, agent.next_cursor = get_provider_tickets(
+        agent.support_provider, cursor, page_length
     )
     return agent
 
 
+def get_session_agent(session_key):
+    """Return the cached context (provider, team, email, disabled) of the session's agent.
+
+    Endpoints should use this instead of `get_agent`, it never loads tickets.
+    """
+    session = get_session(session_key)
+    if not session or not session.agent:
+        frappe.throw("Invalid Session Key")
+    return session.agent
+
+
+@frappe.whitelist(allow_guest=True)
+@read_from_replica
+def get_tickets(
+    session_key, cursor=None, page_length=None, assignee=None, open_or_close=None
+):
+    agent = get_session_agent(session_key)
+    tickets, next_cursor = get_provider_tickets(
+        agent.support_provider, cursor, page_length, assignee, open_or_close
+    )
+    return {"tickets": tickets, "next_cursor": next_cursor}
+
+
+@frappe.whitelist(allow_guest=True)
+@read_from_replica
+def get_dashboard(session_key, site_name=None):
+    """Ticket summary of the provider and the agent, and of `site_name` if given."""
+    agent = get_session_agent(session_key)
+    dashboard = {
+        "provider": get_summary(
+            agent.support_provider, "Provider", agent.support_provider
+        ),
+        "agent": get_summary(agent.support_provider, "Agent", agent.email),
+    }
+    if site_name:
+        dashboard["site"] = get_summary(agent.support_provider, "Site", site_name)
+    return dashboard
+
+
 @frappe.whitelist(allow_guest=True)
+@pin_to_primary
+def get_next_ticket(session_key):
+    """Assign the most urgent unassigned ticket of the provider to the agent and return it."""
+    agent = get_session_agent(session_key)
+    if issue_name := claim_next_ticket(agent.support_provider, agent.email):
+        return get_ticket(session_key, issue_name)
+
+
+@frappe.whitelist(allow_guest=True)
+@read_from_replica
+def search_issues(session_key, query):
+    agent = get_session_agent(session_key)
+    return search_tickets(query, support_provider=agent.support_provider)
+
+
+def get_provider_tickets(
+    support_provider, cursor=None, page_length=None, assignee=None, open_or_close=None
+):
+    """A page of the provider's tickets, "Open" or "Close" filters before paginating."""
+    Issue = frappe.qb.DocType("Issue")
+    query = get_tickets_query(support_provider, assignee)
+    if open_or_close == "Open":
+        query = query.where(Issue.status != "Closed")
+    elif open_or_close == "Close":
+        query = query.where(Issue.status == "Closed")
+    return paginate(query, Issue, cursor, page_length)
+
+
+def get_tickets_query(support_provider, assignee=None):
+    Issue = frappe.qb.DocType("Issue")
+    query = (
+        frappe.qb.from_(Issue)
+        .select(
+            Issue.name,
+            Issue.subject,
+            Issue.status,
+            Issue.priority,
+            Issue.modified,
+            Issue.creation,
+            Issue.site_name,
+            Issue._assign,
+            Issue._comments,
+        )
+        .where(Issue.support_provider == support_provider)
+    )
+    if assignee:
+        Assignment = frappe.qb.DocType("Support Ticket Assignment")
+        query = (
+            query.inner_join(Assignment)
+            .on(Assignment.issue == Issue.name)
+            .where(
+                (Assignment.user == assignee)
+                & (Assignment.support_provider == support_provider)
+            )
+        )
+    return query
+
+
+@frappe.whitelist(allow_guest=True)
+@pin_to_primary
 def add_agent(session_key, new_agent):
-    agent = get_agent(session_key)
+    agent = get_session_agent(session_key)
 
     new_agent = frappe.parse_json(new_agent)
     email = new_agent.get("email")
@@ -158,16 +243,16 @@ def add_agent(session_key, new_agent):
     )
     new_user.insert(ignore_permissions=True)
 
-    agent_doc = frappe.get_doc("Support Provider Team", agent.team)
-    agent_doc.append("members", {"user": email})
-    agent_doc.save(ignore_permissions=True)
+    with admin_session():
+        add_member(agent.team, email)
 
     return get_agent(session_key, email, with_tickets=False)
 
 
 @frappe.whitelist(allow_guest=True)
+@pin_to_primary
 def remove_agent(session_key, email):
-    agent = get_agent(session_key)
+    agent = get_session_agent(session_key)
     if agent.email == email:
         frappe.throw("You cannot remove yourself.")
 
@@ -188,8 +273,9 @@ def remove_agent(session_key, email):
 
 
 @frappe.whitelist(allow_guest=True)
+@pin_to_primary
 def disable_agent(session_key, email):
-    agent = get_agent(session_key)
+    agent = get_session_agent(session_key)
     if agent.email == email:
         frappe.throw("You cannot disable yourself.")
 
@@ -201,11 +287,15 @@ def disable_agent(session_key, email):
     frappe.db.set_value(
         "Support Team Member", {"user": email, "parent": agent.team}, "disabled", 1
     )
+    clear_session_cache(emails=[email])
+    with admin_session():
+        update_rule_users(agent.support_provider, agent.team, remove=[email])
 
 
 @frappe.whitelist(allow_guest=True)
-def get_ticket(session_key, issue_name):
-    agent = get_agent(session_key)
+@read_from_replica
+def get_ticket(session_key, issue_name, page_length=None):
+    agent = get_session_agent(session_key)
     Issue = frappe.qb.DocType("Issue")
     issue = (
         frappe.qb.from_(Issue)
@@ -233,36 +323,110 @@ def get_ticket(session_key, issue_name):
             title="No Access",
         )
     issue = issue[0]
-    issue.replies = get_replies(issue_name)
+    issue.replies, issue.replies_cursor = get_thread(
+        issue_name, page_length=page_length
+    )
     return issue
 
 
-def get_replies(issue_name):
-    return frappe.get_all(
-        "Communication",
-        fields=[
-            "name",
-            "sender",
-            "recipients",
-            "sender_full_name",
-            "content",
-            "seen",
-            "subject",
-            "creation",
-            "sent_or_received",
-        ],
-        filters={"reference_doctype": "Issue", "reference_name": issue_name},
-        order_by="creation desc",
+@frappe.whitelist(allow_guest=True)
+@read_from_replica
+def get_thread_replies(
+    session_key, issue_name, cursor=None, page_length=None, snippets=0
+):
+    """Older replies on the ticket, see the customer `get_thread_replies`."""
+    agent = get_session_agent(session_key)
+    get_accessible_issues(agent, [issue_name])
+    replies, next_cursor = get_thread(issue_name, cursor, page_length, cint(snippets))
+    return {"replies": replies, "next_cursor": next_cursor}
+
+
+@frappe.whitelist(allow_guest=True)
+@read_from_replica
+def get_reply(session_key, issue_name, reply_name):
+    agent = get_session_agent(session_key)
+    get_accessible_issues(agent, [issue_name])
+    replies = get_reply_rows(issue_name, name=reply_name)
+    if not replies:
+        frappe.throw("This reply does not exist.", frappe.DoesNotExistError)
+    return replies[0]
+
+
+@frappe.whitelist(allow_guest=True)
+def get_changes(session_key, since=None, issue_name=None):
+    """Return the provider's tickets, and replies on `issue_name`, changed after `since`.
+
+    Works like the customer `get_changes`, poll with the returned watermark.
+    Tickets whose assignees changed are included as well.
+    """
+    agent = get_session_agent(session_key)
+    if not since:
+        return {
+            "watermark": encode_watermark(get_start_positions()),
+            "channels": [get_channel("provider", agent.support_provider)],
+        }
+
+    positions = decode_watermark(since)
+    Issue = frappe.qb.DocType("Issue")
+    tickets, has_more = fetch_changes(
+        get_tickets_query(agent.support_provider), Issue, positions, "issues"
+    )
+
+    # assigning writes `_assign` without touching the ticket's `modified`
+    ToDo = frappe.qb.DocType("ToDo")
+    assignments, more_assignments = fetch_changes(
+        frappe.qb.from_(ToDo)
+        .inner_join(Issue)
+        .on(Issue.name == ToDo.reference_name)
+        .select(ToDo.name, ToDo.modified, ToDo.reference_name)
+        .where(
+            (ToDo.reference_type == "Issue")
+            & (Issue.support_provider == agent.support_provider)
+        ),
+        ToDo,
+        positions,
+        "assignments",
+    )
+    reassigned = {row.reference_name for row in assignments} - {
+        ticket.name for ticket in tickets
+    }
+    if reassigned:
+        tickets += (
+            get_tickets_query(agent.support_provider)
+            .where(Issue.name.isin(list(reassigned)))
+            .run(as_dict=True)
+        )
+
+    replies, more_replies = [], False
+    if issue_name and (
+        frappe.db.get_value("Issue", issue_name, "support_provider")
+        == agent.support_provider
+    ):
+        replies, more_replies = fetch_replies(issue_name, positions)
+
+    deleted, more_deleted = get_deleted_since(
+        positions,
+        lambda data: data.get("support_provider") == agent.support_provider,
+        issue_name,
+    )
+    return make_changes(
+        positions,
+        tickets,
+        replies,
+        deleted,
+        has_more or more_assignments or more_replies or more_deleted,
     )
 
 
 @frappe.whitelist(allow_guest=True)
-def reply_to_ticket(session_key, issue_name, reply):
-    agent = get_agent(session_key)
+@pin_to_primary
+def reply_to_ticket(session_key, issue_name, reply, idempotency_key=None):
+    """Reply to the customer and return the reply, see the customer `reply`."""
+    agent = get_session_agent(session_key)
     Issue = frappe.qb.DocType("Issue")
     issue = (
         frappe.qb.from_(Issue)
-        .select(Issue.name)
+        .select(Issue.name, Issue.subject, Issue.raised_by)
         .where(
             (Issue.name == issue_name)
             & (Issue.support_provider == agent.support_provider)
@@ -274,50 +438,54 @@ def reply_to_ticket(session_key, issue_name, reply):
             "You do not have access to this ticket. Please contact your system administrator.",
             title="No Access",
         )
+    issue = issue[0]
+    queued = {}
+
+    def create(reply_key):
+        # sending content inside an object to avoid sanitization of the request,
+        # the portals serve the copy sanitized by support.render
+        content = frappe.parse_json(reply).get("content")
+        with admin_session():
+            name = create_communication(
+                recipients=issue.raised_by,
+                subject=f"Re: {issue.subject}",
+                content=content,
+                doctype="Issue",
+                name=issue_name,
+                sender=agent.email,
+                print_html="",
+                send_me_a_copy=0,
+                print_format="",
+                attachments=[],
+                read_receipt=0,
+                print_letterhead=1,
+                send_email=0,
+            ).get("name")
+        if reply_key:
+            frappe.db.set_value(
+                "Communication",
+                name,
+                "support_idempotency_key",
+                reply_key,
+                update_modified=False,
+            )
+        communication = frappe.get_doc("Communication", name)
+        if not frappe.conf.developer_mode:
+            queued["mail_id"] = queue_mail(
+                "support.outbox.send_communication", communication=communication.name
+            )
+        return communication
 
-    # sending content inside an objecy to avoid sanitization
-    content = frappe.parse_json(reply).get("content")
-    issue = frappe.get_doc("Issue", issue_name)
-    old_user = frappe.session.user
-    frappe.set_user("Administrator")
-    comm = create_communication(
-        recipients=issue.raised_by,
-        subject=f"Re: {issue.subject}",
-        content=content,
-        doctype="Issue",
-        name=issue_name,
-        sender=agent.email,
-        print_html="",
-        send_me_a_copy=0,
-        print_format="",
-        attachments=[],
-        read_receipt=0,
-        print_letterhead=1,
-        send_email=0 if frappe.conf.developer_mode else 1,
-    )
-    frappe.set_user(old_user)
-    reply = frappe.db.get_value(
-        "Communication",
-        comm.get("name"),
-        [
-            "name",
-            "sender",
-            "recipients",
-            "sender_full_name",
-            "content",
-            "seen",
-            "subject",
-            "creation",
-            "sent_or_received",
-        ],
-        as_dict=True,
-    )
-    return reply
+    posted = post_reply(session_key, idempotency_key, issue_name, create)
+    # a retried post does not queue the mail again
+    posted.mail_id = queued.get("mail_id")
+    return posted
 
 
 @frappe.whitelist(allow_guest=True)
+@pin_to_primary
 def toggle_assignee(session_key, issue_name, assignee):
-    agent = get_agent(session_key)
+    agent = get_session_agent(session_key)
     Issue = frappe.qb.DocType("Issue")
     issue = (
         frappe.qb.from_(Issue)
@@ -335,9 +503,8 @@ def toggle_assignee(session_key, issue_name, assignee):
         )
 
     issue = issue[0]
-    assignees = issue.get("_assign") or []
     with admin_session():
-        if assignee not in assignees:
+        if not is_assigned(issue_name, assignee):
             add_assign(
                 {
                     "assign_to": [assignee],
@@ -354,8 +521,9 @@ def toggle_assignee(session_key, issue_name, assignee):
 
 
 @frappe.whitelist(allow_guest=True)
+@pin_to_primary
 def set_status(session_key, issue_name, status):
-    agent = get_agent(session_key)
+    agent = get_session_agent(session_key)
     Issue = frappe.qb.DocType("Issue")
     issue = (
         frappe.qb.from_(Issue)
@@ -372,6 +540,7 @@ def set_status(session_key, issue_name, status):
             title="No Access",
         )
 
+    validate_status(status)
     issue = frappe.get_doc("Issue", issue_name)
     issue.status = status
     with admin_session():
@@ -379,12 +548,173 @@ def set_status(session_key, issue_name, status):
     return issue.status
 
 
+def validate_status(status):
+    if status not in frappe.get_meta("Issue").get_options("status").split("\n"):
+        frappe.throw(f"{escape_html(status)} is not a valid ticket status.")
+
+
+@frappe.whitelist(allow_guest=True)
+@pin_to_primary
+def bulk_set_status(session_key, issue_names, status):
+    agent = get_session_agent(session_key)
+    validate_status(status)
+    issues = get_accessible_issues(agent, issue_names, "status")
+
+    with admin_session():
+        for issue in issues:
+            if issue.status == status:
+                continue
+            doc = frappe.get_doc("Issue", issue.name)
+            doc.status = status
+            doc.save(ignore_permissions=True)
+    return {issue.name: status for issue in issues}
+
+
 @frappe.whitelist(allow_guest=True)
+@pin_to_primary
+def bulk_assign(session_key, issue_names, assignee, remove=False):
+    """Assign `assignee` to all tickets, or unassign with `remove`.
+
+    The assignee gets one mail about all of them, after the transaction commits.
+    """
+    agent = get_session_agent(session_key)
+    if not frappe.db.exists(
+        "Support Team Member", {"user": assignee, "parent": agent.team}
+    ):
+        frappe.throw("Agent does not exist.")
+
+    issues = get_accessible_issues(agent, issue_names, "subject")
+    assigned = set(
+        frappe.get_all(
+            "Support Ticket Assignment",
+            filters={
+                "issue": ("in", [issue.name for issue in issues]),
+                "user": assignee,
+            },
+            pluck="issue",
+        )
+    )
+
+    changed = []
+    with admin_session():
+        for issue in issues:
+            if cint(remove) and issue.name in assigned:
+                remove_assign("Issue", issue.name, assignee)
+            elif not cint(remove) and issue.name not in assigned:
+                add_assign(
+                    {
+                        "assign_to": [assignee],
+                        "doctype": "Issue",
+                        "name": issue.name,
+                        "description": issue.subject,
+                        "notify": 0,
+                    }
+                )
+            else:
+                continue
+            changed.append(issue.name)
+
+    if changed and not cint(remove) and assignee != agent.email:
+        queue_mail(
+            "support.www.support.portal.agent.send_bulk_assignment_mail",
+            assignee=assignee,
+            assigned_by=agent.email,
+            issue_names=changed,
+        )
+    return changed
+
+
+def send_bulk_assignment_mail(assignee, assigned_by, issue_names):
+    issues = frappe.get_all(
+        "Issue", filters={"name": ("in", issue_names)}, fields=["name", "subject"]
+    )
+    rows = "".join(
+        f"<li>{issue.name} - {escape_html(issue.subject)}</li>"
+        for issue in issues
+    )
+    frappe.sendmail(
+        recipients=[assignee],
+        subject=f"Frappe Support: {len(issues)} tickets assigned to you",
+        message=f"""<p>{assigned_by} assigned these tickets to you.</p>
+        <ul>{rows}</ul>
+        <p><a href="{get_url("/support/portal/agent")}">Open the agent portal</a></p>
+        """,
+        now=True,
+    )
+
+
+@frappe.whitelist(allow_guest=True)
+@pin_to_primary
+def bulk_reply(session_key, issue_names, reply):
+    """Post the same reply on all tickets, the mails go out from one background job."""
+    agent = get_session_agent(session_key)
+    issues = get_accessible_issues(agent, issue_names, "subject", "raised_by")
+
+    # sending content inside an object to avoid sanitization
+    content = frappe.parse_json(reply).get("content")
+    communications = []
+    with admin_session():
+        for issue in issues:
+            comm = create_communication(
+                recipients=issue.raised_by,
+                subject=f"Re: {issue.subject}",
+                content=content,
+                doctype="Issue",
+                name=issue.name,
+                sender=agent.email,
+                print_html="",
+                send_me_a_copy=0,
+                print_format="",
+                attachments=[],
+                read_receipt=0,
+                print_letterhead=1,
+                send_email=0,
+            )
+            communications.append(comm.get("name"))
+
+    mail_batch = None
+    if not frappe.conf.developer_mode:
+        mail_batch = outbox.queue_mail_batch(
+            "support.outbox.send_communication",
+            [{"communication": communication} for communication in communications],
+        )
+    return {"communications": communications, "mail_batch": mail_batch}
+
+
+def get_accessible_issues(agent, issue_names, *fields):
+    """Fetch `fields` of the tickets in one query, throw unless the agent can access all."""
+    issue_names = set(frappe.parse_json(issue_names) or [])
+    if not issue_names:
+        frappe.throw("Select at least one ticket.")
+    if len(issue_names) > MAX_PAGE_LENGTH:
+        frappe.throw(f"Select at most {MAX_PAGE_LENGTH} tickets at a time.")
+
+    Issue = frappe.qb.DocType("Issue")
+    issues = (
+        frappe.qb.from_(Issue)
+        .select(Issue.name, *[Issue[field] for field in fields])
+        .where(
+            Issue.name.isin(list(issue_names))
+            & (Issue.support_provider == agent.support_provider)
+        )
+        .orderby(Issue.name)
+        .run(as_dict=True)
+    )
+    if len(issues) != len(issue_names):
+        frappe.throw(
+            "You do not have access to some of these tickets. Please contact your system administrator.",
+            title="No Access",
+        )
+    return issues
+
+
+@frappe.whitelist(allow_guest=True)
+@pin_to_primary
 def add_site(session_key, new_site):
-    agent = get_agent(session_key)
+    agent = get_session_agent(session_key)
 
     new_site = frappe.parse_json(new_site)
-    site_name = new_site.get("site_name")
+    site_name = canonicalize_site_name(new_site.get("site_name"))
     if support_provider := frappe.db.get_value(
         "Supported Site", site_name, "support_provider"
     ):
@@ -402,8 +732,125 @@ def add_site(session_key, new_site):
 
 
 @frappe.whitelist(allow_guest=True)
+@pin_to_primary
+def import_sites(session_key, data):
+    """Onboard sites and their users in bulk.
+
+    `data` is a JSON list or CSV text with `site_name` and `email` columns, one
+    row per user. Every site is saved once with all of its new users, login
+    links for them go out from a single background job.
+    """
+    agent = get_session_agent(session_key)
+    rows = parse_import_rows(data)
+    if len(rows) > MAX_IMPORT_ROWS:
+        frappe.throw(f"Import at most {MAX_IMPORT_ROWS} rows at a time.")
+
+    errors = []
+    site_emails = {}
+    for idx, row in enumerate(rows, 1):
+        row = frappe._dict(row)
+        site_name = canonicalize_site_name(row.site_name or row.site)
+        if not site_name:
+            errors.append({"row": idx, "error": "Site name is missing"})
+            continue
+        # dict keeps the order of the rows and drops duplicates
+        emails = site_emails.setdefault(site_name, {})
+        email = (row.email or "").strip().lower()
+        if not email:
+            continue
+        if not validate_email_address(email):
+            errors.append({"row": idx, "error": f"Invalid email {email}"})
+            continue
+        emails[email] = None
+
+    result = {"sites_created": [], "users_added": 0, "errors": errors, "mail_batch": None}
+    if not site_emails:
+        return result
+
+    providers = dict(
+        frappe.get_all(
+            "Supported Site",
+            filters={"name": ("in", list(site_emails))},
+            fields=["name", "support_provider"],
+            as_list=True,
+        )
+    )
+    # stored emails can be mixed case, imported ones are lowercased
+    existing_users = {
+        (parent, email.lower())
+        for parent, email in frappe.get_all(
+            "Supported Site User",
+            filters={"parenttype": "Supported Site", "parent": ("in", list(site_emails))},
+            fields=["parent", "email"],
+            as_list=True,
+        )
+    }
+
+    new_users = []
+    for site_name, emails in site_emails.items():
+        exists = site_name in providers
+        support_provider = providers.get(site_name)
+        if support_provider and support_provider != agent.support_provider:
+            errors.append(
+                {"site_name": site_name, "error": "Site is supported by another provider"}
+            )
+            continue
+
+        missing = [email for email in emails if (site_name, email) not in existing_users]
+        if support_provider and not missing:
+            continue
+
+        frappe.db.savepoint("import_site")
+        try:
+            if exists:
+                site = frappe.get_doc("Supported Site", site_name)
+                # sites removed by their provider are claimed by the importer
+                site.support_provider = agent.support_provider
+            else:
+                site = frappe.new_doc("Supported Site")
+                site.site_name = site_name
+                site.support_provider = agent.support_provider
+            for email in missing:
+                site.append("support_users", {"email": email, "disabled": 0})
+            site.save(ignore_permissions=True)
+        except (frappe.ValidationError, frappe.DuplicateEntryError) as e:
+            frappe.db.rollback(save_point="import_site")
+            errors.append({"site_name": site_name, "error": str(e)})
+            continue
+
+        if not exists:
+            result["sites_created"].append(site_name)
+        new_users += missing
+
+    result["users_added"] = len(new_users)
+    if new_users:
+        result["mail_batch"] = outbox.queue_mail_batch(
+            "support.www.support.portal.send_login_link_email",
+            [{"email": email} for email in dict.fromkeys(new_users)],
+        )
+    return result
+
+
+def parse_import_rows(data):
+    if isinstance(data, str) and not data.lstrip().startswith("["):
+        return list(csv.DictReader(io.StringIO(data.strip())))
+
+    rows = frappe.parse_json(data)
+    if not isinstance(rows, list):
+        frappe.throw("Import data should be a list of rows.")
+    return rows
+
+
+@frappe.whitelist(allow_guest=True)
+def get_import_status(session_key, mail_batch):
+    get_session_agent(session_key)
+    return outbox.get_batch_status(mail_batch)
+
+
+@frappe.whitelist(allow_guest=True)
+@pin_to_primary
 def remove_site(session_key, site_name):
-    agent = get_agent(session_key)
+    agent = get_session_agent(session_key)
     site = get_site(session_key, site_name)
     if site.support_provider != agent.support_provider:
         frappe.throw("You do not have access to this site.")
@@ -416,8 +863,9 @@ def remove_site(session_key, site_name):
 
 
 @frappe.whitelist(allow_guest=True)
+@read_from_replica
 def get_site(session_key, site_name):
-    agent = get_agent(session_key)
+    agent = get_session_agent(session_key)
 
     SupportedSite = frappe.qb.DocType("Supported Site")
     SupportedSiteUser = frappe.qb.DocType("Supported Site User")
@@ -445,8 +893,9 @@ def get_site(session_key, site_name):
 
 
 @frappe.whitelist(allow_guest=True)
+@read_from_replica
 def get_sites(session_key):
-    agent = get_agent(session_key)
+    agent = get_session_agent(session_key)
     SupportedSite = frappe.qb.DocType("Supported Site")
     SupportedSiteUser = frappe.qb.DocType("Supported Site User")
     sites = (
@@ -1,10 +1,133 @@
 # Copyright (c) 2022, Frappe Technologies Pvt. Ltd. and Contributors
 # License: MIT. See LICENSE
 
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs
 
 import frappe
 from frappe.tests.utils import FrappeTestCase
+from support.registration import verify_credentials
+from support.render import render_content
+from support.www.support.portal import (
+    decode_watermark,
+    encode_watermark,
+    get_or_create_session_key,
+    get_ticket,
+)
+
+
+class StubFrappeSite(BaseHTTPRequestHandler):
+    """Answers login and ping like a Frappe site with a single user."""
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        form = parse_qs(self.rfile.read(length).decode())
+        if form.get("usr") == ["user@example.com"] and form.get("pwd") == ["secret"]:
+            self.respond(200, {"message": "Logged In"}, cookie="sid=valid")
+        else:
+            self.respond(401, {"message": "Incorrect password"})
+
+    def do_GET(self):
+        if "sid=valid" in (self.headers.get("Cookie") or ""):
+            self.respond(200, {"message": "pong"})
+        else:
+            self.respond(403, {"message": "Not permitted"})
+
+    def respond(self, status, body, cookie=None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if cookie:
+            self.send_header("Set-Cookie", f"{cookie}; Path=/")
+        self.end_headers()
+        self.wfile.write(json.dumps(body).encode())
+
+    def log_message(self, *args):
+        pass
 
 
 class TestSupportPortal(FrappeTestCase):
-    pass
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = HTTPServer(("127.0.0.1", 0), StubFrappeSite)
+        cls.site = f"127.0.0.1:{cls.server.server_port}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        super().tearDownClass()
+
+    def test_verify_credentials(self):
+        frappe.cache().delete_keys("support_verified_user:")
+        self.assertTrue(
+            verify_credentials(self.site, "user@example.com", "secret", scheme="http")
+        )
+        self.assertFalse(
+            verify_credentials(self.site, "user@example.com", "wrong", scheme="http")
+        )
+        # a previous user's session must not leak into the next verification
+        self.assertFalse(
+            verify_credentials(self.site, "other@example.com", "secret", scheme="http")
+        )
+
+    def test_render_content(self):
+        content = (
+            "<p>Error &amp; trace</p>\n<script>alert(1)</script>"
+            '<img src="/files/screenshot.png">'
+        )
+        values, missing_thumbnails = render_content(
+            content, {"/files/screenshot.png": "/files/screenshot_small.png"}
+        )
+        self.assertNotIn("<script", values["support_html"])
+        self.assertIn('src="/files/screenshot_small.png"', values["support_html"])
+        self.assertIn('href="/files/screenshot.png"', values["support_html"])
+        self.assertIn('loading="lazy"', values["support_html"])
+        self.assertEqual(values["support_preview"], "Error & trace")
+        self.assertEqual(values["support_content_size"], len(content.encode()))
+        self.assertFalse(missing_thumbnails)
+
+    def test_watermark(self):
+        positions = {
+            "issues": ["2023-01-02 10:00:00", "ISS-0002"],
+            "replies": ["2023-01-01 10:00:00", ""],
+            "deleted": ["2023-01-01 10:00:00", ""],
+            "assignments": ["2023-01-01 10:00:00", ""],
+        }
+        self.assertEqual(decode_watermark(encode_watermark(positions)), positions)
+        self.assertRaises(frappe.ValidationError, decode_watermark, "2023-01-01")
+
+    def test_ticket_of_another_site(self):
+        for site_name, email in (
+            ("mine.example.com", "customer@example.com"),
+            ("foreign.example.com", "other@example.com"),
+        ):
+            if not frappe.db.exists("Supported Site", site_name):
+                frappe.get_doc(
+                    {
+                        "doctype": "Supported Site",
+                        "site_name": site_name,
+                        "support_users": [{"email": email}],
+                    }
+                ).insert(ignore_permissions=True)
+
+        def make_issue(site_name):
+            return frappe.get_doc(
+                {
+                    "doctype": "Issue",
+                    "subject": "Ticket access",
+                    "raised_by": "other@example.com",
+                    "site_name": site_name,
+                }
+            ).insert(ignore_permissions=True)
+
+        key = get_or_create_session_key("customer@example.com")
+        own = make_issue("mine.example.com")
+        self.assertEqual(get_ticket(key=key, issue=own.name).name, own.name)
+
+        foreign = make_issue("foreign.example.com")
+        self.assertRaises(
+            frappe.ValidationError, get_ticket, key=key, issue=foreign.name
+        )